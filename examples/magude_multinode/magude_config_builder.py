@@ -4,6 +4,7 @@ import numpy as np
 import seaborn as sns
 import pandas as pd
 
+from malaria.interventions.campaign_compaction import cluster_deployments
 from malaria.reports.MalariaReport import add_filtered_report, add_event_counter_report, add_filtered_spatial_report
 from dtk.interventions.input_EIR import add_InputEIR
 from dtk.vector.species import set_species_param
@@ -410,21 +411,44 @@ class MozambiqueExperiment(GriddedConfigBuilder):
 #################################################################################################
 # INTERVENTIONS (ADDITIONS TO CAMPAIGN FILE)
 
+def load_deployments(self, filename, date_format="%Y-%m-%d"):
+    # Read a grid-cell event file into a typed deployment table for the cells of this simulation:
+    # fulldate as datetime, simday as integer days since the simulation start, and node_id joined from
+    # nodeid_lookup (grid_cell -> node ID; grid cells are the node IDs when there is none)
+    events = pd.read_csv(filename)
+    events = events.loc[:, [not str(c).startswith('Unnamed') for c in events.columns]]  # saved pandas index
+
+    events['fulldate'] = pd.to_datetime(events['fulldate'], format=date_format)
+    events['simday'] = (events['fulldate'] - pd.Timestamp(self.sim_start_date)).dt.days.astype(np.int64)
+    events = events[events['grid_cell'].isin(self.demo_cells)]
+
+    nodeid_lookup = getattr(self, 'nodeid_lookup', None)
+    if nodeid_lookup:
+        node_ids = pd.DataFrame({'grid_cell': list(nodeid_lookup.keys()), 'node_id': list(nodeid_lookup.values())})
+        events = events.merge(node_ids, on='grid_cell', how='left', sort=False)
+        unmatched = events['node_id'].isnull()
+        if unmatched.any():
+            print("WARNING: dropping {} events in {} of grid cells {} missing from nodeid_lookup".format(
+                unmatched.sum(), filename, sorted(events.loc[unmatched, 'grid_cell'].unique().tolist())))
+            events = events[~unmatched]
+    else:
+        events = events.assign(node_id=events['grid_cell'])
+    events['node_id'] = events['node_id'].astype(np.int64)
+
+    return events.reset_index(drop=True)
+
+
 def add_healthseeking(self, cb, healthseek_fn):
     # Implement basic health-seeking behavior for all individuals in simulation
 
     # Event information files
-    healthseek_events = pd.read_csv(self.healthseek_fn)
-    healthseek_events['simday'] = [convert_to_day(x, self.sim_start_date, "%Y-%m-%d") for x in
-                                   healthseek_events.fulldate]
-    healthseek_events = healthseek_events[np.in1d(healthseek_events['grid_cell'], self.demo_cells)]
-    healthseek_events.reset_index(inplace=True)
+    healthseek_events = self.load_deployments(self.healthseek_fn)
 
     binned_and_grouped = self.try_campaign_compression(healthseek_events)
 
-    for table, group in binned_and_grouped:
-        node_list = group['grid_cell']
-        if sorted(node_list) == self.demo_cells:
+    for _, table in binned_and_grouped.iterrows():
+        node_list = table['node_id']
+        if len(node_list) == len(self.demo_cells):
             node_dict = {"class": "NodeSetAll"}
         else:
             node_dict = {"class": "NodeSetNodeList", "Node_List": node_list}
@@ -465,23 +489,20 @@ def add_itns(self, cb):
     #     # Go by row:
     #
 
-    itn_events = pd.read_csv(self.itn_fn)
-    itn_events['simday'] = [convert_to_day(x, self.sim_start_date, "%Y-%m-%d") for x in itn_events.fulldate]
-    itn_events = itn_events[np.in1d(itn_events['grid_cell'], self.demo_cells)]
-    itn_events.reset_index(inplace=True)
+    itn_events = self.load_deployments(self.itn_fn)
 
     binned_and_grouped = self.try_campaign_compression(itn_events[itn_events['simday'] >= 0])
 
-    for table, group in binned_and_grouped:
-        node_list = group['grid_cell']
-        if sorted(node_list) == self.demo_cells:
+    for _, table in binned_and_grouped.iterrows():
+        node_list = table['node_id']
+        if len(node_list) == len(self.demo_cells):
             nodeIDs = []
         else:
             nodeIDs = node_list
 
         # Regular bednet distribution
         add_ITN_age_season(cb,
-                           start=float(row['simday']),
+                           start=float(table['simday']),
                            age_dep={'youth_cov': float(table['age_cov']),
                                     'youth_min_age': 5,
                                     'youth_max_age': 20},
@@ -494,58 +515,32 @@ def add_itns(self, cb):
                                     'fraction1': float(table['fast_fraction'])},
                            nodeIDs=nodeIDs)
 
-    # Separately handle birth nets:
-    birth_itn_events = itn_events.copy(deep=True)
-    for r, row in itn_events.iterrows():
-        pass
-        # birth_itn_events[]
-    # For each node, find earliest and last
-
-    for r, row in itn_events.iterrows():
-        # Add non-birth nets
-        add_ITN_age_season(cb, start=float(row['simday']),
-                           age_dep={'youth_cov': float(row['age_cov']), 'youth_min_age': 5,
-                                    'youth_max_age': 20},
-                           coverage_all=float(row['cov_all']),
-                           as_birth=False,
-                           seasonal_dep={'min_cov': float(row['min_season_cov']), 'max_day': 1},
-                           discard={'halflife1': 260, 'halflife2': 2106,
-                                    'fraction1': float(row['fast_fraction'])},
-                           nodeIDs=[row['grid_cell']])
-        # Add birth nets
-        try:
-            birth_duration = float(itn_events['simday'][itn + 1] - itn_events['simday'][itn] - 1)
-        except:
-            birth_duration = -1
-
-        if itn < (len(itn_events) - 1) and (itn_events['grid_cell'][itn + 1] == itn_events['grid_cell'][itn]):
-            birth_duration = float(itn_events['simday'][itn + 1] - itn_events['simday'][itn] - 1)
-        else:
-            birth_duration = -1
+    # Separately handle birth nets: each distribution in a cell is followed by birth nets until the next one
+    birth_itn_events = itn_events.sort_values(['grid_cell', 'simday'], kind='mergesort')
+    next_simday = birth_itn_events.groupby('grid_cell')['simday'].shift(-1)
+    birth_itn_events['birth_duration'] = (next_simday - birth_itn_events['simday'] - 1).fillna(-1)
 
-        add_ITN_age_season(cb, start=float(itn_events['simday'][itn]),
-                           age_dep={'youth_cov': float(itn_events['age_cov'][itn]), 'youth_min_age': 5,
+    for row in birth_itn_events.itertuples(index=False):
+        add_ITN_age_season(cb, start=float(row.simday),
+                           age_dep={'youth_cov': float(row.age_cov), 'youth_min_age': 5,
                                     'youth_max_age': 20},
-                           coverage_all=float(itn_events['cov_all'][itn]),
+                           coverage_all=float(row.cov_all),
                            as_birth=True,
-                           seasonal_dep={'min_cov': float(itn_events['min_season_cov'][itn]), 'max_day': 60},
+                           seasonal_dep={'min_cov': float(row.min_season_cov), 'max_day': 60},
                            discard={'halflife1': 260, 'halflife2': 2106,
-                                    'fraction1': float(itn_events['fast_fraction'][itn])},
-                           duration=birth_duration,
-                           nodeIDs=[itn_events['grid_cell'][itn]])
+                                    'fraction1': float(row.fast_fraction)},
+                           duration=float(row.birth_duration),
+                           nodeIDs=[row.node_id])
 
 
 def add_irs(self, cb):
-    irs_events = pd.read_csv(self.irs_fn)
-    irs_events['simday'] = [convert_to_day(x, start_date, date_format) for x in irs_events.fulldate]
-    irs_events = irs_events[np.in1d(irs_events['grid_cell'], self.demo_cells)]
-    irs_events.reset_index(inplace=True)
+    irs_events = self.load_deployments(self.irs_fn)
 
     binned_and_grouped = self.try_campaign_compression(irs_events)
 
-    for table, group in binned_and_grouped:
-        node_list = group['grid_cell']
-        if sorted(node_list) == self.demo_cells:
+    for _, table in binned_and_grouped.iterrows():
+        node_list = table['node_id']
+        if len(node_list) == len(self.demo_cells):
             nodeIDs = []
         else:
             nodeIDs = node_list
@@ -562,68 +557,60 @@ def add_irs(self, cb):
 
 
 def add_msat(self, cb):
-    msat_events = pd.read_csv(self.msat_fn)
-    msat_events['simday'] = [convert_to_day(x, start_date, date_format) for x in msat_events.fulldate]
-    msat_events = msat_events[np.in1d(msat_events['grid_cell'], self.demo_cells)]
-    msat_events.reset_index(inplace=True)
+    msat_events = self.load_deployments(self.msat_fn)
+
+    binned_and_grouped = self.try_campaign_compression(msat_events[['node_id', 'simday', 'cov_all']])
 
-    for msat in range(len(msat_events)):
+    for _, table in binned_and_grouped.iterrows():
         add_drug_campaign(cb, campaign_type='MSAT', drug_code='AL',
-                          start_days=[float(msat_events['simday'][msat])],
-                          coverage=msat_events['cov_all'][msat], repetitions=1, interval=60,
-                          nodes=[nodeid_lookup[msat_events['grid_cell'][msat]]])
+                          start_days=[float(table['simday'])],
+                          coverage=float(table['cov_all']), repetitions=1, interval=60,
+                          nodes=table['node_id'])
 
 
 def add_mda(self, cb):
-    mda_events = pd.read_csv(self.mda_fn)
-    mda_events['simday'] = [convert_to_day(x, start_date, date_format) for x in mda_events.fulldate]
-    mda_events = mda_events[np.in1d(mda_events['grid_cell'], self.demo_cells)]
-    mda_events.reset_index(inplace=True)
+    mda_events = self.load_deployments(self.mda_fn)
 
-    for mda in range(len(mda_events)):
+    binned_and_grouped = self.try_campaign_compression(mda_events[['node_id', 'simday', 'cov_all']])
+
+    for _, table in binned_and_grouped.iterrows():
         add_drug_campaign(cb, campaign_type='MDA', drug_code='DP',
-                          start_days=[float(mda_events['simday'][mda])],
-                          coverage=float(mda_events['cov_all'][mda]), repetitions=1, interval=60,
-                          nodes=[nodeid_lookup[mda_events['grid_cell'][mda]]])
+                          start_days=[float(table['simday'])],
+                          coverage=float(table['cov_all']), repetitions=1, interval=60,
+                          nodes=table['node_id'])
 
 
 def add_rcd(self, cb):
-    stepd_events = pd.read_csv(self.stepd_fn)
-    stepd_events['simday'] = [convert_to_day(x, start_date, date_format) for x in stepd_events.fulldate]
-    stepd_events = stepd_events[np.in1d(stepd_events['grid_cell'], self.demo_cells)]
-    stepd_events.reset_index(inplace=True)
+    stepd_events = self.load_deployments(self.stepd_fn)
+
+    # interval is a duration in days rather than a coverage, so it is kept exact
+    binned_and_grouped = self.try_campaign_compression(
+        stepd_events[['node_id', 'simday', 'coverage', 'trigger_coverage', 'interval']], exact_params=['interval'])
 
-    for sd in range(len(stepd_events)):
+    for _, table in binned_and_grouped.iterrows():
         # cov = np.min([1.,float(rcd_people_num) / float(pop_lookup[stepd_events['grid_cell'][sd]])])
         add_drug_campaign(cb, campaign_type='rfMSAT', drug_code='AL',
-                          start_days=[float(stepd_events['simday'][sd])],
-                          coverage=float(stepd_events['coverage'][sd]),
-                          trigger_coverage=float(stepd_events['trigger_coverage'][sd]),
+                          start_days=[float(table['simday'])],
+                          coverage=float(table['coverage']),
+                          trigger_coverage=float(table['trigger_coverage']),
                           # coverage=cov,
-                          interval=float(stepd_events['interval'][sd]),
-                          nodes=[nodeid_lookup[stepd_events['grid_cell'][sd]]])
-
-
-def try_campaign_compression(self, intervention_df, bin_fidelity=0.05):
-    # Because implementing things on a grid_cell level leads to enormous campaign files, try to group things together wherever possible
-    def round_nearest(x, a):
-        return round(round(x / a) * a, -int(math.floor(math.log10(a))))
-
-    binned_intervention_df = intervention_df.copy(deep=True)
-
-    # Bin all fields other than grid_cell and date:
-    field_list = list(intervention_df.columns)
-    field_list.remove(['grid_cell', 'fulldate', 'simday'])
-
-    # Bin these fields with bin width = bin_fidelity
-    for field in field_list:
-        binned_intervention_df[field] = intervention_df[field].map(lambda x: round_nearest(x, bin_fidelity))
-
-    # Group by the new binned fields, as well as by date
-    grouped_by_fields = ['simday'] + field_list
-    binned_and_grouped = binned_intervention_df.groupby(grouped_by_fields)
-
-    return binned_and_grouped
+                          interval=float(table['interval']),
+                          nodes=table['node_id'])
+
+
+def try_campaign_compression(self, intervention_df, bin_fidelity=0.05, exact_params=()):
+    # Because implementing things on a grid_cell level leads to enormous campaign files, group the grid cells of
+    # each date whose parameters are all within bin_fidelity / 2 of a common value into one node-list event.
+    # Parameters in exact_params are only grouped when equal.
+    params = [c for c in intervention_df.columns if c not in ['event', 'grid_cell', 'node_id', 'fulldate', 'simday']]
+    tolerance = dict((param, 0 if param in exact_params else bin_fidelity / 2.) for param in params)
+    clusters, report = cluster_deployments(intervention_df, params=params, tolerance=tolerance,
+                                           node_col='node_id', day_col='simday')
+    if self.verbose:
+        print("Campaign compression: {} grid-cell events -> {} events, max parameter change {}".format(
+            report['n_deployments'], report['n_events'], report['max_distortion']))
+
+    return clusters
 
 
 def implement_interventions(self, cb):
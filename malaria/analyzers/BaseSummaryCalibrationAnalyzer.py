@@ -1,7 +1,10 @@
 import logging
+import os
 import threading
+import numpy as np
 import pandas as pd
 from calibtool.analyzers.BaseComparisonAnalyzer import BaseComparisonAnalyzer
+from malaria.analyzers.ReplicateAccumulator import ReplicateAccumulator
 
 logger = logging.getLogger(__name__)
 thread_lock = threading.Lock()
@@ -9,20 +12,31 @@ thread_lock = threading.Lock()
 
 class BaseSummaryCalibrationAnalyzer(BaseComparisonAnalyzer):
 
+    def __init__(self, *args, **kwargs):
+        # Optional vectorized likelihood: batch_compare_fn(ref, sim) with ref (bins x channels) and
+        # sim (samples x bins x channels) arrays, returning one value per sample and skipping missing values,
+        # e.g. from batch_LL_calculators
+        self.batch_compare_fn = kwargs.pop('batch_compare_fn', None)
+        # Optional binary cache backend: path prefix for .npy arrays referenced from the (small) JSON cache
+        self.cache_path = kwargs.pop('cache_path', None)
+        super(BaseSummaryCalibrationAnalyzer, self).__init__(*args, **kwargs)
+        self.accumulator = ReplicateAccumulator()  # subclasses may add each result from apply as it arrives
+
     def combine(self, parsers):
         """
         Combine the simulation data into a single table for all analyzed simulations.
         """
 
-        selected = [p.selected_data[id(self)] for p in parsers.values() if id(self) in p.selected_data]
+        # Average replicates of each sample with running sums, adding any results not already added by apply
+        for p in parsers.values():
+            if id(self) in p.selected_data:
+                d = p.selected_data[id(self)]
+                self.accumulator.add(d.sample, d)
 
-        # Stack selected_data from each parser, adding unique (sim_id) and shared (sample) levels to MultiIndex
-        combine_levels = ['sample', 'sim_id', 'channel']
-        combined = pd.concat(selected, axis=1,
-                             keys=[(d.sample, d.sim_id) for d in selected],
-                             names=combine_levels)
+        means = self.accumulator.means()
+        self.accumulator.reset()
 
-        self.data = combined.groupby(level=['sample', 'channel'], axis=1).mean()
+        self.data = pd.concat(means.values(), axis=1, keys=means.keys(), names=['sample', 'channel'])
         logger.debug(self.data)
 
     @staticmethod
@@ -37,11 +51,30 @@ class BaseSummaryCalibrationAnalyzer(BaseComparisonAnalyzer):
         """
         return self.compare_fn(self.join_reference(sample, self.reference))
 
+    def batch_compare(self):
+        """
+        Assess all samples at once: align the reference to the simulation bins a single time
+        and evaluate batch_compare_fn on the stacked (samples x bins x channels) simulation data.
+        N.B. reference bins with missing values are dropped for every sample; missing simulation values are NaN,
+        for batch_compare_fn to leave out per sample as join_reference(...).dropna() does.
+        """
+        ref = self.reference.dropna()
+        samples = self.data.columns.get_level_values('sample').unique()
+        columns = pd.MultiIndex.from_product([samples, ref.columns], names=['sample', 'channel'])
+
+        sim = self.data.reindex(index=ref.index, columns=columns).values
+        sim = sim.reshape(len(ref.index), len(samples), len(ref.columns)).transpose(1, 0, 2)
+
+        return pd.Series(np.asarray(self.batch_compare_fn(ref.values, sim)), index=samples)
+
     def finalize(self):
         """
         Calculate the output result for each sample.
         """
-        self.result = self.data.groupby(level='sample', axis=1).apply(self.compare)
+        if self.batch_compare_fn:
+            self.result = self.batch_compare()
+        else:
+            self.result = self.data.groupby(level='sample', axis=1).apply(self.compare)
         logger.debug(self.result)
 
     def cache(self):
@@ -53,6 +86,8 @@ class BaseSummaryCalibrationAnalyzer(BaseComparisonAnalyzer):
         tmp_ref.columns = pd.MultiIndex.from_tuples([('ref', x) for x in tmp_ref.columns])
 
         cache = pd.concat([self.data, tmp_ref], axis=1).dropna()
+        if self.cache_path:
+            return self.serialize_binary(cache, self.cache_path)
         return self.serialize(cache)  # Return in serializable format
 
     @staticmethod
@@ -98,3 +133,62 @@ class BaseSummaryCalibrationAnalyzer(BaseComparisonAnalyzer):
             output['ref'] = df['ref'].reset_index().to_dict(orient='list')
         return output
 
+    @staticmethod
+    def serialize_binary(df, cache_path):
+        """
+        Write the same content as serialize to binary files, returning a small JSON serializable pointer:
+            <cache_path>.samples.npy - (sample x bin x channel) array of simulation samples
+            <cache_path>.ref.npy - (bin x channel) array of the reference, if present
+        The pointer holds the file names, sample and channel names, and the (shared) bin index columns.
+        :param df: pandas.DataFrame with MultiIndex columns (sample, channel) with final sample column = 'ref'
+        :param cache_path: path prefix of the binary files
+        :return: JSON representation of the pointer, to be read with load_cache
+        """
+
+        samples = sorted(s for s in df.columns.levels[0].tolist() if s != 'ref')
+        channels = df[samples[0]].columns.tolist() if samples else df['ref'].columns.tolist()
+
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        output = {'format': 'npy',
+                  'samples': samples,
+                  'channels': channels,
+                  'index': pd.DataFrame(index=df.index).reset_index().to_dict(orient='list'),
+                  'samples_file': cache_path + '.samples.npy'}
+
+        columns = pd.MultiIndex.from_product([samples, channels])
+        values = df.reindex(columns=columns).values.reshape(len(df.index), len(samples), len(channels))
+        np.save(output['samples_file'], values.transpose(1, 0, 2))
+
+        if 'ref' in df.columns.levels[0]:
+            output['ref_file'] = cache_path + '.ref.npy'
+            np.save(output['ref_file'], df['ref'][channels].values)
+
+        return output
+
+    @staticmethod
+    def load_cache(cache, samples=None):
+        """
+        Expand a cache into the serialize layout, memory-mapping only the requested samples of a binary cache
+        :param cache: output of serialize or serialize_binary
+        :param samples: optional list of samples to load, default=all
+        :return: {'samples': [...], 'ref': {...}} as documented in serialize
+        """
+
+        if cache.get('format') != 'npy':
+            return cache
+
+        def to_dict(values):
+            d = dict(cache['index'])
+            d.update((channel, values[:, i].tolist()) for i, channel in enumerate(cache['channels']))
+            return d
+
+        positions = range(len(cache['samples'])) if samples is None else [cache['samples'].index(s) for s in samples]
+        values = np.load(cache['samples_file'], mmap_mode='r')
+        output = {'samples': [to_dict(values[i]) for i in positions]}
+        if 'ref_file' in cache:
+            output['ref'] = to_dict(np.load(cache['ref_file'], mmap_mode='r'))
+        return output
+
@@ -2,10 +2,12 @@ import logging
 from abc import abstractmethod
 import pandas as pd
 import numpy as np
-from malaria.analyzers.Helpers import convert_annualized, convert_to_counts, age_from_birth_cohort, aggregate_on_index
+from malaria.analyzers.Helpers import \
+    convert_annualized, convert_to_counts, age_from_birth_cohort, aggregate_on_index, compile_bin_plan, \
+    summary_report_channels
 from scipy.stats import binom
 from dtk.utils.parsers.malaria_summary import summary_channel_to_pandas
-from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer, thread_lock
+from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer
 from calibtool.LL_calculators import gamma_poisson_pandas, beta_binomial_pandas
 
 logger = logging.getLogger(__name__)
@@ -42,17 +44,27 @@ class ChannelByAgeCohortAnalyzer(BaseCalibrationAnalyzer):
                                        'Observations': (self.reference[self.population_channel]
                                                         * self.reference[self.channel])})
 
+        # Reference binning is the same for every simulation, so compile it once
+        self.bin_plan = compile_bin_plan(self.reference.index)
+
+        # Optionally read channels from columnar stores kept in summary_store_dir for this analysis,
+        # in which case the parser no longer needs to decode the summary report
+        self.summary_report = self.filenames[0]
+        self.summary_store_dir = kwargs.get('summary_store_dir')
+        if self.summary_store_dir:
+            self.filenames = [f for f in self.filenames if f != self.summary_report]
+
     def apply(self, parser):
         """
         Extract data from output data and accumulate in same bins as reference.
         """
 
         # Load data from simulation
-        data = parser.raw_data[self.filenames[0]]
+        data, channel_to_pandas = summary_report_channels(parser, self.summary_report, self.summary_store_dir)
 
         # Get channels by age and time series
-        channel_series = summary_channel_to_pandas(data, self.channel)
-        population_series = summary_channel_to_pandas(data, self.population_channel)
+        channel_series = channel_to_pandas(data, self.channel)
+        population_series = channel_to_pandas(data, self.population_channel)
         channel_data = pd.concat([channel_series, population_series], axis=1)
 
         # Convert Average Population to Person Years
@@ -61,17 +73,15 @@ class ChannelByAgeCohortAnalyzer(BaseCalibrationAnalyzer):
                                           reporting_interval=channel_series.Reporting_Interval)
         channel_data['Trials'] = person_years
 
-        with thread_lock:  # TODO: re-code following block to ensure thread safety (Issue #758)?
-
-            # Calculate Incidents from Annual Incidence and Person Years
-            channel_data['Observations'] = convert_to_counts(channel_data[self.channel], channel_data.Trials)
+        # Calculate Incidents from Annual Incidence and Person Years
+        channel_data['Observations'] = convert_to_counts(channel_data[self.channel], channel_data.Trials)
 
-            # Reset multi-index and perform transformations on index columns
-            df = channel_data.reset_index()
-            df = age_from_birth_cohort(df)  # calculate age from time for birth cohort
+        # Reset multi-index and perform transformations on index columns
+        df = channel_data.reset_index()
+        df = age_from_birth_cohort(df)  # calculate age from time for birth cohort
 
-            # Re-bin according to reference and return single-channel Series
-            sim_data = aggregate_on_index(df, self.reference.index, keep=['Observations', 'Trials'])
+        # Re-bin according to reference and return single-channel Series
+        sim_data = aggregate_on_index(df, self.bin_plan, keep=['Observations', 'Trials'])
 
         sim_data.sample = parser.sim_data.get('__sample_index__')
         sim_data.sim_id = parser.sim_id
@@ -3,10 +3,11 @@ import pandas as pd
 
 from dtk.utils.parsers.malaria_summary import summary_channel_to_pandas
 
-from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer, thread_lock
+from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer
 from calibtool import LL_calculators
-from calibtool.analyzers.Helpers import \
-    convert_to_counts, age_from_birth_cohort, season_from_time, aggregate_on_index
+from malaria.analyzers.Helpers import \
+    convert_to_counts, age_from_birth_cohort, season_from_time, aggregate_on_index, compile_bin_plan, \
+    summary_report_channels
 
 logger = logging.getLogger(__name__)
 
@@ -29,39 +30,48 @@ class ChannelBySeasonAgeDensityCohortAnalyzer(BaseCalibrationAnalyzer):
         channels_ix = ref_ix.names.index('Channel')
         self.channels = ref_ix.levels[channels_ix].values
 
+        # Reference binning is the same for every simulation, so compile it once per channel
+        self.bin_plans = {channel: compile_bin_plan(self.reference.loc(axis=1)[channel].index)
+                          for channel in self.channels}
+
         self.seasons = kwargs.get('seasons')
 
+        # Optionally read channels from columnar stores kept in summary_store_dir for this analysis,
+        # in which case the parser no longer needs to decode the summary report
+        self.summary_report = self.filenames[0]
+        self.summary_store_dir = kwargs.get('summary_store_dir')
+        if self.summary_store_dir:
+            self.filenames = [f for f in self.filenames if f != self.summary_report]
+
     def apply(self, parser):
         """
         Extract data from output simulation data and accumulate in same bins as reference.
         """
 
         # Load data from simulation
-        data = parser.raw_data[self.filenames[0]]
+        data, channel_to_pandas = summary_report_channels(parser, self.summary_report, self.summary_store_dir)
 
         # Population by age and time series (to convert parasite prevalence to counts)
-        population = summary_channel_to_pandas(data, self.population_channel)
+        population = channel_to_pandas(data, self.population_channel)
 
         # Coerce channel data into format for comparison with reference
         channel_data_dict = {}
         for channel in self.channels:
 
             # Prevalence by density, age, and time series
-            channel_data = summary_channel_to_pandas(data, channel)
-
-            with thread_lock:  # TODO: re-code following block to ensure thread safety (Issue #758)?
+            channel_data = channel_to_pandas(data, channel)
 
-                # Calculate counts from prevalence and population
-                channel_counts = convert_to_counts(channel_data, population)
+            # Calculate counts from prevalence and population
+            channel_counts = convert_to_counts(channel_data, population)
 
-                # Reset multi-index and perform transformations on index columns
-                df = channel_counts.reset_index()
-                df = age_from_birth_cohort(df)  # calculate age from time for birth cohort
-                df = season_from_time(df, seasons=self.seasons)  # calculate month from time
+            # Reset multi-index and perform transformations on index columns
+            df = channel_counts.reset_index()
+            df = age_from_birth_cohort(df)  # calculate age from time for birth cohort
+            df = season_from_time(df, seasons=self.seasons)  # calculate month from time
 
-                # Re-bin according to reference and return single-channel Series
-                rebinned = aggregate_on_index(df, self.reference.loc(axis=1)[channel].index, keep=[channel])
-                channel_data_dict[channel] = rebinned[channel].rename('Counts')
+            # Re-bin according to reference and return single-channel Series
+            rebinned = aggregate_on_index(df, self.bin_plans[channel], keep=[channel])
+            channel_data_dict[channel] = rebinned[channel].rename('Counts')
 
         sim_data = pd.concat(channel_data_dict.values(), keys=channel_data_dict.keys(), names=['Channel'])
         sim_data = pd.DataFrame(sim_data)  # single-column DataFrame for standardized combine/compare pattern
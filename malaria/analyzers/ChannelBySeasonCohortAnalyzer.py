@@ -8,9 +8,10 @@ from scipy.stats import binom
 
 from calibtool import LL_calculators
 from dtk.utils.parsers.malaria_summary import summary_channel_to_pandas
-from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer, thread_lock
-from calibtool.analyzers.Helpers import \
-    convert_annualized, convert_to_counts, age_from_birth_cohort, aggregate_on_index, aggregate_on_month
+from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer
+from malaria.analyzers.Helpers import \
+    convert_annualized, convert_to_counts, age_from_birth_cohort, aggregate_on_index, aggregate_on_month, \
+    compile_bin_plan
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,10 @@ class ChannelBySeasonCohortAnalyzer(BaseCalibrationAnalyzer):
         super(ChannelBySeasonCohortAnalyzer, self).__init__(site, weight, compare_fn)
         self.reference = site.get_reference_data(self.site_ref_type)
 
+        # Reference binning is the same for every simulation, so compile it once per species
+        self.bin_plans = {channel: compile_bin_plan(self.reference.loc(axis=1)[channel].index)
+                          for channel in self.site.metadata['species']}
+
     def apply(self, parser):
         """
         Extract data from output data and accumulate in same bins as reference.
@@ -37,10 +42,11 @@ class ChannelBySeasonCohortAnalyzer(BaseCalibrationAnalyzer):
         # Load data from simulation
         data = parser.raw_data[self.filenames[0]]
 
+        # N.B. parser.raw_data is shared, so derive new frames rather than assigning into slices of it
         data = data[2*365:]
-        data['Day'] = data['Time'].apply(lambda x: (x + 1) % 365)
+        data = data.assign(Day=(data['Time'] + 1) % 365)
         data = data[['Day', 'Species', 'Population', 'VectorPopulation']]
-        data['Vector_per_Human'] = data['VectorPopulation'] / data['Population']
+        data = data.assign(Vector_per_Human=data['VectorPopulation'] / data['Population'])
         data = data.groupby(['Day', 'Species'])['Vector_per_Human'].apply(np.mean).reset_index()
 
         dateparser = lambda x: datetime.datetime.strptime(x, '%j').month
@@ -54,16 +60,14 @@ class ChannelBySeasonCohortAnalyzer(BaseCalibrationAnalyzer):
 
         for channel in self.site.metadata['species']:
 
-            with thread_lock:  # TODO: re-code following block to ensure thread safety (Issue #758)?
-
-                # Reset multi-index and perform transformations on index columns
-                df = data.copy().reset_index()
-                df = df.rename(columns={'Counts': channel})
-                del df['Channel']
+            # Reset multi-index and perform transformations on index columns
+            df = data.reset_index()
+            df = df.rename(columns={'Counts': channel})
+            del df['Channel']
 
-                # Re-bin according to reference and return single-channel Series
-                rebinned = aggregate_on_index(df, self.reference.loc(axis=1)[channel].index, keep=[channel])
-                channel_data_dict[channel] = rebinned[channel].rename('Counts')
+            # Re-bin according to reference and return single-channel Series
+            rebinned = aggregate_on_index(df, self.bin_plans[channel], keep=[channel])
+            channel_data_dict[channel] = rebinned[channel].rename('Counts')
 
         sim_data = pd.concat(channel_data_dict.values(), keys=channel_data_dict.keys(), names=['Channel'])
         sim_data = pd.DataFrame(sim_data)  # single-column DataFrame for standardized combine/compare pattern
@@ -1,20 +1,44 @@
 import itertools
+import os
 import random
+import copy
+import hashlib
+import inspect
+import pickle
+import threading
 from datetime import date, datetime
 import calendar
 import logging
 from collections import OrderedDict
-# from geopy.distance import vincenty
-import numpy.ma as ma
 import json
 
 import pandas as pd
 import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
 
 import dtk.utils.parsers.malaria_summary as malaria_summary
 
 logger = logging.getLogger(__name__)
 
+# Process-wide cache of memory-mapped neighbor indices, keyed by (distance file, mtime, size)
+neighbor_index_cache = {}
+neighbor_index_lock = threading.Lock()
+
+# Version of the GarkiDB store layout, stores of other versions are rebuilt
+garki_store_format = 1
+
+# Process-wide cache of processed reference data, keyed by (loader, csv files with mtime and size, metadata)
+reference_data_cache = {}
+reference_data_lock = threading.Lock()
+
+# Version of the pickled reference data cache, bumped to invalidate every cache written by previous versions
+reference_data_cache_format = 1
+
+# Month number (1-12) of each day of a 365-day year, indexed by day of year (1-365); entry 0 is unused
+day_of_year_months = np.array([0] + [date.fromordinal(d).month for d in range(1, 366)])
+month_names = np.array(calendar.month_name, dtype=object)
+
 
 def grouped_df(df, pfprdict, index, column_keep, column_del):
     """
@@ -79,37 +103,22 @@ def season_channel_age_density_csv_to_pandas(csvfilename, metadata):
                                                             5000          5
       ...
 
-    """
-    df = pd.read_csv(csvfilename)
-    df = df.loc[df['Village'] == metadata['village']]
+    The csv file is converted once into a store partitioned by village (see get_garki_store), from which the
+    observations of the village are binned with np.histogramdd. As with the categorical groupby this replaces,
+    every age and density bin is listed (with zero counts) for each season observed in the village.
 
-    pfprBinsDensity = metadata['parasitemia_bins']
-    uL_per_field = 0.5 / 200.0  # from Garki PDF - page 111 - 0.5 uL per 200 views
-    pfprBins = 1 - np.exp(-np.asarray(pfprBinsDensity) * uL_per_field)
-    seasons = metadata['seasons']
-    pfprdict = dict(zip(pfprBins, pfprBinsDensity))
-
-    bins = OrderedDict([
-        ('Season', metadata['seasons']),
-        ('Age Bin', metadata['age_bins']),
-        ('PfPR Bin', pfprBins)
-    ])
-    bin_tuples = list(itertools.product(*bins.values()))
-    index = pd.MultiIndex.from_tuples(bin_tuples, names=bins.keys())
-
-    df = df.loc[df['Seasons'].isin(seasons)]
-    df = df.rename(columns={'Seasons': 'Season', 'Age': 'Age Bin'})
-
-    df2 = grouped_df(df, pfprdict, index, 'Parasitemia', 'Gametocytemia')
-    df3 = grouped_df(df, pfprdict, index, 'Gametocytemia', 'Parasitemia')
-    dfJoined = df2.join(df3).fillna(0)
-    dfJoined = pd.concat([dfJoined['Gametocytemia'], dfJoined['Parasitemia']])
-    dfJoined.name = 'Counts'
-    dftemp = dfJoined.reset_index()
-    dftemp['Channel'] = 'PfPR by Gametocytemia and Age Bin'
-    dftemp.loc[len(dftemp)/2:, 'Channel'] = 'PfPR by Parasitemia and Age Bin'
-    dftemp = dftemp.rename(columns={'Seasons': 'Season', 'PfPR Bins': 'PfPR Bin', 'Age Bins': 'Age Bin'})
-    dftemp = dftemp.set_index(['Channel', 'Season', 'Age Bin', 'PfPR Bin'])
+    """
+    counts = OrderedDict((channel, garki_season_age_density_counts(get_garki_store(csvfilename), metadata, channel))
+                         for channel in ['Gametocytemia', 'Parasitemia'])
+    seasons = sorted(metadata['seasons'])
+    observed = np.flatnonzero(counts['Parasitemia'].sum(axis=(1, 2)))
+
+    index = pd.MultiIndex.from_product([['PfPR by %s and Age Bin' % channel for channel in counts],
+                                        [seasons[i] for i in observed],
+                                        metadata['age_bins'],
+                                        metadata['parasitemia_bins']],
+                                       names=['Channel', 'Season', 'Age Bin', 'PfPR Bin'])
+    dftemp = pd.DataFrame({'Counts': np.concatenate([c[observed].ravel() for c in counts.values()])}, index=index)
 
     logger.debug('\n%s', dftemp)
 
@@ -230,12 +239,13 @@ def convert_to_counts(rates, pops):
     rate_idx = rates.index.names
     pop_idx = pops.index.names
 
-    # Join rates to population counts on the binning of the latter
-    df = rates.reset_index().set_index(pop_idx)\
-              .join(pops, how='left')\
-              .reset_index().set_index(rate_idx)
+    # Look up population counts on the binning of the latter without modifying either input
+    pop_keys = rates.index.droplevel([n for n in rate_idx if n not in pop_idx])
+    if isinstance(pop_keys, pd.MultiIndex):
+        pop_keys = pop_keys.reorder_levels(pop_idx)
+    pop_values = pops.reindex(pop_keys).values
 
-    counts = (df[rates.name] * df[pops.name]).rename(rates.name)
+    counts = pd.Series(rates.values * pop_values, index=rates.index, name=rates.name)
     return counts
 
 
@@ -243,35 +253,48 @@ def age_from_birth_cohort(df):
     """
     Reinterpret 'Time' as 'Age Bin' for a birth cohort
     :param df: a pandas.DataFrame of counts and 'Time' in days
-    :return: a pandas.DataFrame including an additional (or overwritten) 'Age Bin' column
+    :return: a new pandas.DataFrame including an additional (or overwritten) 'Age Bin' column
     """
 
-    df['Age Bin'] = df['Time'] / 365.0   # Time in days but Age in years
-    return df
+    return df.assign(**{'Age Bin': df['Time'].values / 365.0})   # Time in days but Age in years
+
+
+def month_from_day_of_year(day_of_year, seasons=None):
+    """
+    Look up the named Month (or Season) of each day of year with a precomputed table
+    :param day_of_year: array-like of days of year from 1 to 365
+    :param seasons: optional dictionary of month names to season names
+    :return: numpy object array of month names, or of season names (None for months without a season)
+    """
+
+    names = month_names
+    if seasons:
+        names = np.array([seasons.get(m) for m in month_names], dtype=object)
+
+    return names[day_of_year_months[np.asarray(day_of_year, dtype=int)]]
 
 
 def season_from_time(df, seasons=None):
     """
     Reinterpret 'Time' as 'Month' or 'Season' for seasonal data
-    :param df: a pandas.DataFrame of counts and 'Time' in days
+    :param df: a pandas.DataFrame of counts and 'Time' in days (or 'Day of Year' from 1 to 365)
     :param seasons: optional dictionary of month names to season names
-    :return: a pandas.DataFrame including an additional 'Season' or 'Month' column
+    :return: a new pandas.DataFrame including an additional 'Season' or 'Month' column
     """
 
     # Day of Year from Time (in days)
-    day_of_year = 1 + df['Time'] % 365
+    if 'Time' in df.columns:
+        day_of_year = 1 + df['Time'].values % 365
+    else:
+        day_of_year = df['Day of Year'].values
 
-    # Assign each Day of Year to a named Month
-    month = day_of_year.apply(lambda x: calendar.month_name[date.fromordinal(x).month])
+    # Assign each Day of Year to a named Month (or Season if optional lookup is available)
+    month = month_from_day_of_year(day_of_year, seasons)
 
-    # Return season if optional lookup is available, otherwise return month
     if seasons:
-        df['Season'] = month.apply(lambda x: seasons.get(x))
-        df.dropna(subset=['Season'], inplace=True)
-    else:
-        df['Month'] = month
+        return df.assign(Season=month)[pd.notnull(month)]
 
-    return df
+    return df.assign(Month=month)
 
 
 def pairwise(iterable):
@@ -281,15 +304,125 @@ def pairwise(iterable):
     return itertools.izip(a, b)
 
 
+def compile_bin_plan(index):
+    """
+    Precompile the binning of aggregate_on_index for a reference (multi-)index, so that it can be reused
+    for every simulation and channel compared to that reference
+    :param index: pandas.(Multi)Index of categorical values or right-bin-edges, e.g. ['early', 'late'] or [5, 15, 100]
+    :return: dict with the 'index' it was compiled from and a list of 'levels', each a dict with
+             'name' - the DataFrame column to be binned
+             'kind' - 'categories' (object dtype), 'edges' (int64/float64 dtype) or 'values' (no aggregation)
+             'values' - the sorted categories or the right-bin-edges
+             'labels' - the pandas.Index used to label the aggregated level (categorical for right-bin-edges)
+    """
+
+    if isinstance(index, pd.MultiIndex):
+        levels = index.levels
+    else:
+        levels = [index]  # Only one "level" for Index. Put into list for generic pattern as for MultiIndex
+
+    plan_levels = []
+    for ix in levels:
+        if ix.dtype == 'object':
+            values = pd.Index(np.unique(ix.values), name=ix.name)
+            plan_levels.append({'name': ix.name, 'kind': 'categories', 'values': values, 'labels': values})
+        elif ix.dtype in ['int64', 'float64']:
+            if not (ix.is_monotonic_increasing and ix.is_unique):
+                raise ValueError('Bin edges for MultiIndex level (%s) must increase monotonically' % ix.name)
+            labels = pd.CategoricalIndex(ix.values, categories=ix.values, ordered=True, name=ix.name)
+            plan_levels.append({'name': ix.name, 'kind': 'edges', 'values': ix.values, 'labels': labels})
+        else:
+            logger.warning('Unexpected dtype=%s for MultiIndex level (%s). No aggregation performed.', ix.dtype, ix.name)
+            plan_levels.append({'name': ix.name, 'kind': 'values', 'values': None, 'labels': None})
+
+    return {'index': index, 'levels': plan_levels}
+
+
+def aggregate_on_bin_plan(df, plan, keep):
+    """
+    Sum the keep columns of df into the bins of a compiled plan using np.searchsorted and np.bincount.
+    Equivalent to the pd.cut and groupby(...).sum()[keep].dropna() of aggregate_on_index: only bins with data
+    are returned, in reference level order, summed in row order with missing values skipped.
+    :param df: a pandas.DataFrame with columns matching the plan level names
+    :param plan: dict returned by compile_bin_plan
+    :param keep: list of columns to keep
+    :return: pandas.DataFrame of keep columns aggregated and indexed on the plan binning
+    """
+
+    valid = np.ones(len(df), dtype=bool)
+    codes, labels = [], []
+    for level in plan['levels']:
+        if level['name'] not in df.columns:
+            raise Exception('Cannot perform aggregation as MultiIndex level (%s) not found in DataFrame:\n%s' % (level['name'], df.head()))
+        values = df[level['name']].values
+
+        if level['kind'] == 'categories':
+            # Keep values present in reference index-level values; drop any that are not
+            level_codes = level['values'].get_indexer(values)
+            valid &= level_codes >= 0
+            level_labels = level['labels']
+        elif level['kind'] == 'edges':
+            # Right-closed bins (-inf, e0], (e0, e1], ... as pd.cut; NaN and values above the last edge are dropped
+            level_codes = np.searchsorted(level['values'], values, side='left')
+            valid &= (level_codes < len(level['values'])) & (values > -np.inf)
+            level_labels = level['labels']
+        else:
+            level_values, level_codes = np.unique(values, return_inverse=True)
+            level_labels = pd.Index(level_values, name=level['name'])
+        codes.append(level_codes)
+        labels.append(level_labels)
+
+    shape = tuple(len(level_labels) for level_labels in labels)
+    n_bins = int(np.prod(shape))
+    flat = np.ravel_multi_index([level_codes[valid] for level_codes in codes], shape)
+
+    occupied = np.flatnonzero(np.bincount(flat, minlength=n_bins))
+    keep_bins = np.ones(len(occupied), dtype=bool)
+
+    sums = []
+    for column in keep:
+        weights = df[column].values[valid]
+        if weights.dtype.kind == 'f':
+            weights = np.where(np.isnan(weights), 0, weights)  # as groupby sum, skip missing values
+        summed = np.bincount(flat, weights=weights, minlength=n_bins)[occupied]
+        if weights.dtype.kind in 'iub':
+            summed = summed.astype(np.int64)
+        keep_bins &= ~np.isnan(summed) if summed.dtype.kind == 'f' else True
+        sums.append(summed)
+
+    # Label the occupied bins on the plan levels, as groupby would
+    occupied = occupied[keep_bins]
+    bin_codes = np.unravel_index(occupied, shape)
+    if len(labels) == 1:
+        result_index = labels[0][bin_codes[0]]
+    else:
+        result_index = pd.MultiIndex(labels, list(bin_codes), names=[level['name'] for level in plan['levels']])
+
+    df = pd.DataFrame(OrderedDict((column, summed[keep_bins]) for column, summed in zip(keep, sums)),
+                      index=result_index, columns=keep)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Data aggregated/joined on MultiIndex levels:\n%s', df.head(15))
+    return df
+
+
 def aggregate_on_index(df, index, keep=slice(None)):
     """
     Aggregate and re-index data on specified (multi-)index (levels and) intervals
     :param df: a pandas.DataFrame with columns matching the specified (Multi)Index (level) names
-    :param index: pandas.(Multi)Index of categorical values or right-bin-edges, e.g. ['early', 'late'] or [5, 15, 100]
+    :param index: pandas.(Multi)Index of categorical values or right-bin-edges, e.g. ['early', 'late'] or [5, 15, 100],
+                  or a bin plan precompiled from one by compile_bin_plan
     :param keep: optional list of columns to keep, default=all
     :return: pandas.Series or DataFrame of specified channels aggregated and indexed on the specified binning
+    N.B. the input DataFrame is not modified, so concurrent calls on shared data are safe
     """
 
+    if keep != slice(None):
+        plan = index if isinstance(index, dict) else compile_bin_plan(index)
+        return aggregate_on_bin_plan(df, plan, keep)
+
+    if isinstance(index, dict):
+        index = index['index']
+
     if isinstance(index, pd.MultiIndex):
         levels = index.levels
     else:
@@ -321,7 +454,7 @@ def aggregate_on_index(df, index, keep=slice(None)):
             #     else:
             #         labels.append("{0} - {1}".format(low, high))
 
-            df[ix.name] = pd.cut(df[ix.name], bin_edges, labels=labels)
+            df = df.assign(**{ix.name: pd.cut(df[ix.name], bin_edges, labels=labels)})
 
         else:
             logger.warning('Unexpected dtype=%s for MultiIndex level (%s). No aggregation performed.', ix.dtype, ix.name)
@@ -340,42 +473,692 @@ def aggregate_on_month(sim, ref):
     return sim
 
 
+def read_spatial_report_header(filename, filtered=None):
+    """
+    Parse only the header of a SpatialReport binary file:
+        int32 n_nodes, int32 n_tstep, [float32 start, float32 interval (filtered reports only)],
+        uint32 nodeids[n_nodes], float32 data[n_tstep][n_nodes]
+    :param filename: path to a SpatialReport_*.bin or SpatialReportMalariaFiltered_*.bin file
+    :param filtered: whether the header includes start and interval, default is to infer it from the filename
+    :return: dict of 'n_nodes', 'n_tstep', 'start', 'interval', 'nodeids' and the byte 'offset' of the data
+    """
+    if filtered is None:
+        filtered = 'Filtered' in os.path.basename(filename)
+
+    with open(filename, 'rb') as fin:
+        n_nodes, n_tstep = np.fromfile(fin, dtype=np.int32, count=2)
+        start, interval = np.fromfile(fin, dtype=np.float32, count=2) if filtered else (None, None)
+        nodeids = np.fromfile(fin, dtype=np.uint32, count=n_nodes)
+
+    header_size = 16 if filtered else 8
+    return {'n_nodes': int(n_nodes), 'n_tstep': int(n_tstep), 'start': start, 'interval': interval,
+            'nodeids': nodeids.astype(np.int64), 'offset': header_size + 4 * int(n_nodes)}
+
+
+def read_spatial_report(filename, times=None, nodes=None, filtered=None):
+    """
+    Read selected timesteps and nodes of a SpatialReport binary file without loading the whole channel:
+    the time x node data block is memory-mapped, so only the requested rows are read from disk.
+    :param filename: path to a SpatialReport_*.bin or SpatialReportMalariaFiltered_*.bin file
+    :param times: optional timestep index, slice or list of indices, default=all
+    :param nodes: optional list of node IDs, default=all (in file order)
+    :param filtered: see read_spatial_report_header
+    :return: dict with the same 'n_nodes', 'n_tstep', 'nodeids' and 'data' keys as the parsed report,
+             where 'data' is (time x node) for a slice or list of times, and a single node vector for an integer time
+    """
+    header = read_spatial_report_header(filename, filtered)
+    data = np.memmap(filename, dtype=np.float32, mode='r', offset=header['offset'],
+                     shape=(header['n_tstep'], header['n_nodes']))
+
+    nodeids = header['nodeids']
+    if times is not None:
+        data = data[times]
+    if nodes is not None:
+        node_idx = pd.Index(nodeids).get_indexer(nodes)
+        if (node_idx < 0).any():
+            raise Exception('Nodes %s not found in spatial report %s' % (np.asarray(nodes)[node_idx < 0], filename))
+        data = data[..., node_idx]
+        nodeids = nodeids[node_idx]
+
+    return {'n_nodes': len(nodeids), 'n_tstep': header['n_tstep'], 'nodeids': nodeids,
+            'data': np.array(data, dtype=float)}
+
+
 def get_spatial_report_data_at_date(sp_data, date):
+    """
+    Node vector of a spatial report channel at one timestep
+    :param sp_data: parsed spatial report dict ('nodeids', 'data'), or the path to its .bin file,
+                    in which case only that timestep is read from disk
+    :param date: timestep index
+    :return: pandas.DataFrame with 'node' and 'data' columns
+    """
+    if not isinstance(sp_data, dict):
+        sp_data = read_spatial_report(sp_data, times=date)
+        return pd.DataFrame({'node': sp_data['nodeids'], 'data': sp_data['data']})
 
     return pd.DataFrame({'node': sp_data['nodeids'],
                          'data': sp_data['data'][date]})
 
 
-def get_risk_by_distance(df_sim, distances, ddf):
+def file_md5(filename, blocksize=2**20):
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as fin:
+        for block in iter(lambda: fin.read(blocksize), b''):
+            md5.update(block)
+    return md5.hexdigest()
 
-    nodelist = df_sim['node'].values.tolist()
-    rel_risk = []
 
+def build_neighbor_index(csvfilename):
+    """
+    Convert a pairwise distance csv file with columns 'node1', 'node2', 'dist' to a compact neighbor index
+    :param csvfilename: path to the distance matrix csv file
+    :return: dict of numpy arrays in CSR layout:
+             'node1' - sorted unique node IDs
+             'indptr' - offsets such that the neighbors of node1[i] are at [indptr[i]:indptr[i+1]]
+             'node2', 'dist' - neighbor node IDs and distances, sorted by distance for each node
+    """
+    df = pd.read_csv(csvfilename, usecols=['node1', 'node2', 'dist'])
+    df = df.sort_values(['node1', 'dist'], kind='mergesort')
+
+    node1, counts = np.unique(df['node1'].values, return_counts=True)
+
+    return {'node1': node1,
+            'indptr': np.concatenate(([0], np.cumsum(counts))),
+            'node2': df['node2'].values,
+            'dist': df['dist'].values.astype(float)}
+
+
+def cache_root():
+    """
+    Root directory of the binary caches built from input files: $MALARIA_CACHE_DIR if set, else ~/.cache/malaria.
+    Caches are kept out of the package tree, which may be read-only once installed.
+    """
+    return os.environ.get('MALARIA_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'malaria')
+
+
+def default_cache_dir(filename, suffix):
+    """
+    Cache directory of an input file under cache_root(), e.g. ~/.cache/malaria/distances.csv_1a2b3c4d5e6f.index
+    :param filename: path to the input file
+    :param suffix: kind of cache, e.g. 'index', 'cache' or 'store'
+    :return: directory path, unique to the absolute path of the input file
+    """
+    path = os.path.abspath(filename)
+    return os.path.join(cache_root(), '%s_%s.%s' % (os.path.basename(path),
+                                                    hashlib.md5(path.encode('utf-8')).hexdigest()[:12], suffix))
+
+
+def atomic_write(path, write_fn, mode='wb'):
+    """
+    Write a file under a temporary name and rename it into place,
+    so that concurrent readers (threads or processes) never see a partial file
+    :param path: destination file path
+    :param write_fn: function writing the contents to an open file object, e.g. lambda f: np.save(f, arr)
+    :param mode: 'wb' for binary or 'w' for text contents
+    """
+    tmp_file = '%s.%d.%d.tmp' % (path, os.getpid(), threading.current_thread().ident or 0)
+    try:
+        with open(tmp_file, mode) as fout:
+            write_fn(fout)
+        _replace_file(tmp_file, path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+# os.rename already replaces an existing destination atomically on POSIX
+_replace_file = getattr(os, 'replace', os.rename)
+
+
+def read_manifest(manifest_file):
+    """
+    Read the manifest.json of a binary cache directory
+    :param manifest_file: path to the manifest
+    :return: the manifest (with ordered keys), or None if it is missing or unreadable
+    """
+    try:
+        with open(manifest_file) as fin:
+            return json.load(fin, object_pairs_hook=OrderedDict)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def get_neighbor_index(csvfilename, cache_dir=None):
+    """
+    Load the neighbor index for a pairwise distance csv file, building it on first use.
+
+    The index is stored in cache_dir as .npy arrays, keyed by the csv file hash
+    and validated against its mtime and size. The arrays are memory-mapped read-only and shared by all callers
+    in the process, so repeated site/analyzer construction costs neither a csv parse nor a copy.
+    If the cache cannot be written, the index is built in memory instead.
+
+    :param csvfilename: path to the distance matrix csv file
+    :param cache_dir: optional directory for the binary index, default is default_cache_dir(csvfilename, 'index')
+    :return: dict of read-only numpy arrays, see build_neighbor_index
+    """
+    stat = os.stat(csvfilename)
+    key = (os.path.abspath(csvfilename), stat.st_mtime, stat.st_size)
+    names = ['node1', 'indptr', 'node2', 'dist']
+
+    with neighbor_index_lock:
+        if key in neighbor_index_cache:
+            return neighbor_index_cache[key]
+
+        cache_dir = cache_dir or default_cache_dir(csvfilename, 'index')
+        manifest_file = os.path.join(cache_dir, 'manifest.json')
+
+        def index_file(md5, name):
+            return os.path.join(cache_dir, '%s_%s.npy' % (md5, name))
+
+        try:
+            manifest = read_manifest(manifest_file) or {}
+            # Only re-hash the csv when it has been touched since the index was built or arrays have gone missing
+            if manifest.get('mtime') != stat.st_mtime or manifest.get('size') != stat.st_size or \
+                    not all(os.path.exists(index_file(manifest.get('md5'), name)) for name in names):
+                md5 = file_md5(csvfilename)
+                if not all(os.path.exists(index_file(md5, name)) for name in names):
+                    logger.info('Building neighbor index for %s', csvfilename)
+                    index = build_neighbor_index(csvfilename)
+                    if not os.path.isdir(cache_dir):
+                        os.makedirs(cache_dir)
+                    for name in names:
+                        atomic_write(index_file(md5, name), lambda fout: np.save(fout, index[name]))
+
+                # Arrays of earlier versions of the csv are superseded
+                for filename in os.listdir(cache_dir):
+                    if filename.endswith('.npy') and not filename.startswith(md5 + '_'):
+                        try:
+                            os.remove(os.path.join(cache_dir, filename))
+                        except OSError:
+                            pass  # e.g. still mapped by another process on Windows
+
+                manifest = {'md5': md5, 'mtime': stat.st_mtime, 'size': stat.st_size}
+                atomic_write(manifest_file, lambda fout: json.dump(manifest, fout), mode='w')
+
+            index = {name: np.load(index_file(manifest['md5'], name), mmap_mode='r') for name in names}
+
+        except (IOError, OSError) as e:
+            logger.warning('Unable to cache the neighbor index of %s in %s, building it in memory: %s',
+                           csvfilename, cache_dir, e)
+            index = build_neighbor_index(csvfilename)
+            for arr in index.values():
+                arr.setflags(write=False)
+
+        neighbor_index_cache[key] = index
+
+    return index
+
+
+def _loader_md5(loader):
+    # md5 of the source file of the loader module, so that a change to the loader or to the helpers it calls
+    # from the same module invalidates the cache; the loader bytecode if the source is not available
+    try:
+        return file_md5(inspect.getsourcefile(loader))
+    except (TypeError, IOError, OSError):
+        return hashlib.md5(getattr(getattr(loader, '__code__', None), 'co_code', b'')).hexdigest()
+
+
+def _reference_data_key(loader, csvfilenames, metadata, kwargs):
+    files = tuple((os.path.abspath(f), os.stat(f).st_mtime, os.stat(f).st_size) for f in csvfilenames)
+    return ('%s.%s' % (loader.__module__, loader.__name__), files,
+            json.dumps(metadata, sort_keys=True, default=str), json.dumps(kwargs, sort_keys=True, default=str))
+
+
+def cached_reference_data(loader, csvfilenames, metadata, cache_dir=None, **kwargs):
+    """
+    Processed reference data of a CalibSite, parsed once per process and once per csv content on disk:
+    loader(*csvfilenames, metadata, **kwargs) is only called the first time a combination of loader, csv contents,
+    metadata and kwargs is requested. The result is kept in memory, keyed by the csv paths, mtimes and sizes,
+    and pickled to cache_dir under a hash of the csv contents, loader (name and module source), metadata, kwargs
+    and cache format, so that constructing many sites and analyzers costs one parse per file.
+    If the cache cannot be written, the data is still returned.
+
+    The cache files are unpickled, so cache_dir (and $MALARIA_CACHE_DIR) must only be writable by trusted users.
+
+    reference_data = cached_reference_data(ento_data, reference_csv, self.metadata)
+
+    :param loader: function processing the csv file(s) and metadata into reference data, e.g. ento_data
+    :param csvfilenames: path to the reference csv file, or list of paths passed to the loader in order
+    :param metadata: the site metadata passed to the loader
+    :param cache_dir: optional directory for the binary cache, default is default_cache_dir(first csv file, 'cache')
+    :param kwargs: additional keyword arguments of the loader
+    :return: a copy of the reference data, which the caller is free to modify
+    """
+    if not isinstance(csvfilenames, (list, tuple)):
+        csvfilenames = [csvfilenames]
+    key = _reference_data_key(loader, csvfilenames, metadata, kwargs)
+
+    with reference_data_lock:
+        if key not in reference_data_cache:
+            digest = hashlib.md5()
+            for part in [file_md5(f) for f in csvfilenames] + [key[0], key[2], key[3], _loader_md5(loader),
+                                                                  str(reference_data_cache_format)]:
+                digest.update(part.encode('utf-8'))
+            cache_dir = cache_dir or default_cache_dir(csvfilenames[0], 'cache')
+            cache_file = os.path.join(cache_dir, '%s.pkl' % digest.hexdigest())
+
+            data = None
+            if os.path.exists(cache_file):
+                try:
+                    with open(cache_file, 'rb') as fin:
+                        data = pickle.load(fin)
+                except Exception as e:
+                    logger.warning('Rebuilding unreadable reference data cache %s: %s', cache_file, e)
+
+            if data is None:
+                logger.info('Processing reference data %s with %s', csvfilenames, key[0])
+                data = loader(*(list(csvfilenames) + [metadata]), **kwargs)
+                try:
+                    if not os.path.isdir(cache_dir):
+                        os.makedirs(cache_dir)
+                    atomic_write(cache_file, lambda fout: pickle.dump(data, fout, protocol=pickle.HIGHEST_PROTOCOL))
+                except (IOError, OSError) as e:
+                    logger.warning('Unable to cache reference data in %s: %s', cache_dir, e)
+
+            reference_data_cache[key] = data
+
+        return copy.deepcopy(reference_data_cache[key])
+
+
+# MalariaSummaryReport channel groupings with known bins, see summary_report_bins
+summary_report_groupings = ['DataByTime', 'DataByTimeAndAgeBins', 'DataByTimeAndPfPRBinsAndAgeBins']
+
+
+def summary_report_bins(data, grouping):
+    """
+    Bins of a MalariaSummaryReport channel grouping, as used by summary_channel_to_pandas
+    :param data: parsed MalariaSummaryReport JSON
+    :param grouping: one of summary_report_groupings
+    :return: OrderedDict of index level name to bin values
+    """
+    bins = OrderedDict([('Time', data['DataByTime']['Time Of Report'])])
+    if grouping == 'DataByTimeAndPfPRBinsAndAgeBins':
+        bins['PfPR Bin'] = data['Metadata']['Parasitemia Bins']
+    if grouping in ['DataByTimeAndAgeBins', 'DataByTimeAndPfPRBinsAndAgeBins']:
+        bins['Age Bin'] = data['Metadata']['Age Bins']
+    return bins
+
+
+def build_summary_store(report_path, store_dir=None):
+    """
+    Convert a MalariaSummaryReport JSON file into a columnar store of .npy files:
+    one array per channel (shaped by its time/density/age bins) plus one array per bin axis,
+    described by a manifest.json that also records the report metadata and source mtime/size.
+    Only the channels of summary_report_groupings are stored; other groupings
+    (e.g. DataByTimeAndInfectiousnessBinsAndAgeBins) are skipped.
+    :param report_path: path to output/MalariaSummaryReport_*.json
+    :param store_dir: directory for the store
+    :return: the store manifest, see get_summary_store
+    """
+    stat = os.stat(report_path)
+
+    with open(report_path) as fin:
+        data = json.load(fin)
+
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+
+    manifest = {'mtime': stat.st_mtime, 'size': stat.st_size, 'metadata': {}, 'groupings': {}, 'channels': {}}
+    for key in ['Start_Day', 'Reporting_Interval']:
+        manifest['metadata'][key] = data['Metadata'].get(key)
+
+    for grouping, group_data in data.items():
+        if grouping not in summary_report_groupings:
+            if grouping.startswith('DataByTime'):
+                logger.debug('Leaving %s with unknown bins out of the summary report store of %s',
+                             grouping, report_path)
+            continue
+        bins = summary_report_bins(data, grouping)
+        axes = []
+        for name, values in bins.items():
+            axis_file = 'axis_%s.npy' % name.replace(' ', '_')
+            atomic_write(os.path.join(store_dir, axis_file), lambda fout: np.save(fout, np.asarray(values)))
+            axes.append([name, axis_file])
+        manifest['groupings'][grouping] = axes
+
+        shape = tuple(len(values) for values in bins.values())
+        for channel, channel_data in group_data.items():
+            channel_file = 'channel_%d.npy' % len(manifest['channels'])
+            atomic_write(os.path.join(store_dir, channel_file),
+                         lambda fout: np.save(fout, np.asarray(channel_data).reshape(shape)))
+            manifest['channels'][channel] = {'grouping': grouping, 'file': channel_file}
+
+    # Manifest written last, so an interrupted conversion is rebuilt on next use
+    atomic_write(os.path.join(store_dir, 'manifest.json'), lambda fout: json.dump(manifest, fout), mode='w')
+
+    return manifest
+
+
+def get_summary_store(report_path, store_dir=None):
+    """
+    Open the columnar store of a MalariaSummaryReport JSON file, converting it on first use
+    or whenever the report has changed since (by mtime and size).
+    Re-running analysis over the same simulations then skips JSON decoding entirely.
+    :param report_path: path to output/MalariaSummaryReport_*.json
+    :param store_dir: directory for the store
+    :return: dict with the store 'dir' and its 'manifest' ('metadata', 'groupings' and 'channels'),
+             to be read one channel at a time with summary_store_channel_to_pandas,
+             or None if the store cannot be written or the report does not match its bins
+    """
+    manifest = read_manifest(os.path.join(store_dir, 'manifest.json'))
+    if manifest is not None:
+        stat = os.stat(report_path) if os.path.exists(report_path) else None
+        if stat and (manifest['mtime'] != stat.st_mtime or manifest['size'] != stat.st_size):
+            manifest = None
+
+    if manifest is None:
+        logger.info('Building summary report store for %s', report_path)
+        try:
+            manifest = build_summary_store(report_path, store_dir)
+        except (IOError, OSError, ValueError) as e:
+            logger.warning('Unable to write the summary report store of %s in %s: %s', report_path, store_dir, e)
+            return None
+
+    return {'dir': store_dir, 'manifest': manifest}
+
+
+def summary_report_channels(parser, report, store_dir=None):
+    """
+    MalariaSummaryReport data of a simulation, read through a columnar store when store_dir is given
+    (converting the report on first use) or else from the JSON decoded by the parser.
+    :param parser: simulation output parser passed to the analyzer's apply
+    :param report: report path relative to the simulation directory, e.g. 'output/MalariaSummaryReport_Annual_Report.json'
+    :param store_dir: optional directory for the stores of an analysis run, one per simulation and report.
+                      The report is then expected to be left out of the analyzer filenames.
+    :return: (data, channel_to_pandas) to be read as channel_to_pandas(data, channel)
+    """
+    if not store_dir:
+        return parser.raw_data[report], malaria_summary.summary_channel_to_pandas
+
+    report_path = os.path.join(parser.sim_dir, report)
+    store = get_summary_store(report_path, os.path.join(store_dir, '%s_%s.store' % (parser.sim_id,
+                                                                                    os.path.basename(report))))
+    if store is not None:
+        return store, summary_store_channel_to_pandas
+
+    with open(report_path) as fin:
+        return json.load(fin), malaria_summary.summary_channel_to_pandas
+
+
+def summary_store_channel_to_pandas(store, channel):
+    """
+    Memory-map a single channel from a summary report store
+    :param store: dict returned by get_summary_store
+    :param channel: channel name, e.g. 'PfPR by Parasitemia and Age Bin'
+    :return: pandas.Series indexed on the channel bins, as returned by summary_channel_to_pandas
+    """
+    manifest = store['manifest']
+    try:
+        channel_info = manifest['channels'][channel]
+    except KeyError:
+        raise Exception('Unable to find channel %s in summary report store %s' % (channel, store['dir']))
+
+    axes = manifest['groupings'][channel_info['grouping']]
+    bins = OrderedDict((name, np.load(os.path.join(store['dir'], axis_file))) for name, axis_file in axes)
+    values = np.load(os.path.join(store['dir'], channel_info['file']), mmap_mode='r')
+
+    multi_index = pd.MultiIndex.from_product(list(bins.values()), names=list(bins.keys()))
+    channel_series = pd.Series(np.asarray(values).ravel(), index=multi_index, name=channel)
+    channel_series.Start_Day = manifest['metadata']['Start_Day']
+    channel_series.Reporting_Interval = manifest['metadata']['Reporting_Interval']
+
+    return channel_series
+
+
+def garki_store_arrays(csvfilename, partition='Village'):
+    """
+    Read a GarkiDB parasitology csv file (https://github.com/pselvaraj87/Malaria-GarkiDB) into the columns of a store
+    partitioned by village: rows are sorted by village, text columns (Village, Seasons, Date) are kept
+    as integer codes into their categories (-1 for missing values), and numeric columns as they are parsed.
+    Rows with a missing village come first and belong to no partition.
+    :param csvfilename: path to e.g. GarkiDBparasitology.csv or GarkiDBparasitology_dates.csv
+    :param partition: column to partition the rows by
+    :return: (manifest, arrays) where the manifest records the columns (with their file name and text categories),
+             the row range of each village and the source mtime/size, and arrays maps file names to numpy arrays
+    """
+    stat = os.stat(csvfilename)
+
+    df = pd.read_csv(csvfilename)
+    # Sort on the same codes the partition column is stored as, so each village is one contiguous row range
+    df = df.iloc[np.argsort(pd.factorize(df[partition], sort=True)[0], kind='mergesort')]
+
+    manifest = {'format': garki_store_format, 'mtime': stat.st_mtime, 'size': stat.st_size, 'rows': len(df),
+                'partition': partition, 'columns': OrderedDict(), 'partitions': {}}
+    arrays = {}
+    for i, column in enumerate(df.columns):
+        column_file = 'column_%d.npy' % i
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values):
+            arrays[column_file] = values.values
+            manifest['columns'][column] = {'file': column_file}
+        else:
+            codes, categories = pd.factorize(values, sort=True)
+            arrays[column_file] = codes.astype(np.int32)
+            manifest['columns'][column] = {'file': column_file, 'categories': [str(c) for c in categories]}
+
+    codes = arrays[manifest['columns'][partition]['file']]
+    for code, name in enumerate(manifest['columns'][partition]['categories']):
+        manifest['partitions'][name] = [int(np.searchsorted(codes, code, 'left')),
+                                        int(np.searchsorted(codes, code, 'right'))]
+
+    return manifest, arrays
+
+
+def write_garki_store(store_dir, manifest, arrays):
+    """
+    Write the columns of a GarkiDB store as .npy files described by a manifest.json
+    :param store_dir: directory for the store
+    :param manifest: manifest returned by garki_store_arrays
+    :param arrays: arrays returned by garki_store_arrays
+    """
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir)
+    for column_file, values in arrays.items():
+        atomic_write(os.path.join(store_dir, column_file), lambda fout: np.save(fout, values))
+
+    # Manifest written last, so an interrupted conversion is rebuilt on next use
+    atomic_write(os.path.join(store_dir, 'manifest.json'), lambda fout: json.dump(manifest, fout), mode='w')
+
+
+def build_garki_store(csvfilename, store_dir, partition='Village'):
+    """
+    Convert a GarkiDB parasitology csv file into a columnar store of .npy files, see garki_store_arrays
+    :param csvfilename: path to e.g. GarkiDBparasitology.csv or GarkiDBparasitology_dates.csv
+    :param store_dir: directory for the store
+    :param partition: column to partition the rows by
+    :return: the store manifest, see get_garki_store
+    """
+    manifest, arrays = garki_store_arrays(csvfilename, partition)
+    write_garki_store(store_dir, manifest, arrays)
+    return manifest
+
+
+def get_garki_store(csvfilename, store_dir=None):
+    """
+    Open the columnar store of a GarkiDB parasitology csv file, converting it on first use
+    or whenever the csv has changed since (by mtime and size).
+    If the store cannot be written, the columns read from the csv file are kept in memory instead.
+    :param csvfilename: path to the GarkiDB parasitology csv file
+    :param store_dir: optional directory for the store, default is default_cache_dir(csvfilename, 'store')
+    :return: dict with the store 'dir' and its 'manifest' ('columns' with their 'file' and text 'categories',
+             and 'partitions' with the [start, stop) rows of each village), to be read with garki_store_columns
+    """
+    store_dir = store_dir or default_cache_dir(csvfilename, 'store')
+
+    manifest = read_manifest(os.path.join(store_dir, 'manifest.json'))
+    if manifest is not None:
+        stat = os.stat(csvfilename) if os.path.exists(csvfilename) else None
+        if stat and (manifest['mtime'] != stat.st_mtime or manifest['size'] != stat.st_size):
+            manifest = None
+        elif manifest.get('format') != garki_store_format:
+            manifest = None
+
+    if manifest is None:
+        logger.info('Building GarkiDB store for %s', csvfilename)
+        manifest, arrays = garki_store_arrays(csvfilename)
+        try:
+            write_garki_store(store_dir, manifest, arrays)
+        except (IOError, OSError) as e:
+            logger.warning('Unable to write the GarkiDB store of %s in %s, keeping it in memory: %s',
+                           csvfilename, store_dir, e)
+            return {'dir': None, 'manifest': manifest, 'arrays': arrays}
+
+    return {'dir': store_dir, 'manifest': manifest}
+
+
+def garki_store_columns(store, villages, columns=None):
+    """
+    Memory-map the rows of some villages from a GarkiDB store
+    :param store: dict returned by get_garki_store
+    :param villages: village name or list of village names (unknown villages have no rows)
+    :param columns: optional list of columns to read, default=all
+    :return: OrderedDict of column name to numpy array (integer codes for text columns, -1 for missing values)
+    """
+    manifest = store['manifest']
+    if not isinstance(villages, (list, tuple)):
+        villages = [villages]
+    ranges = [manifest['partitions'][v] for v in villages if v in manifest['partitions']]
+
+    output = OrderedDict()
+    for column in columns or list(manifest['columns'].keys()):
+        column_file = manifest['columns'][column]['file']
+        if 'arrays' in store:
+            values = store['arrays'][column_file]
+        else:
+            values = np.load(os.path.join(store['dir'], column_file), mmap_mode='r')
+        if len(ranges) == 1:
+            output[column] = values[ranges[0][0]:ranges[0][1]]
+        else:
+            output[column] = np.concatenate([values[start:stop] for start, stop in ranges] or [values[:0]])
+    return output
+
+
+def garki_store_to_pandas(store, villages, columns=None):
+    """
+    Rows of some villages from a GarkiDB store as they are read from the csv file (in village order),
+    replacing pd.read_csv(csvfilename) followed by a filter on the village
+    :param store: dict returned by get_garki_store
+    :param villages: village name or list of village names
+    :param columns: optional list of columns to read, default=all
+    :return: pandas.DataFrame
+    """
+    data = garki_store_columns(store, villages, columns)
+    for column, values in data.items():
+        categories = store['manifest']['columns'][column].get('categories')
+        if categories is not None:
+            # Missing values (code -1) read back as NaN, as read_csv gives them
+            data[column] = np.asarray(categories + [np.nan], dtype=object)[np.where(values < 0, len(categories), values)]
+        else:
+            data[column] = np.array(values)
+    return pd.DataFrame(data, columns=list(data.keys()))
+
+
+def _right_closed_histogram_sample(values):
+    # pd.cut bins are right-closed (e0, e1] but np.histogramdd bins are left-closed [e0, e1): bin the negated values
+    values = np.asarray(values, dtype=float)
+    return np.where(values > -np.inf, -values, np.nan)
+
+
+def garki_season_age_density_counts(store, metadata, channel):
+    """
+    Count the observations of a village by season, age bin and density bin with np.histogramdd
+    :param store: dict returned by get_garki_store for a GarkiDB parasitology csv file with a Seasons column
+    :param metadata: dict with the 'village', 'seasons', 'age_bins' and 'parasitemia_bins' (densities per uL)
+    :param channel: 'Parasitemia' or 'Gametocytemia' (fraction of fields positive)
+    :return: (seasons x age bins x density bins) array of counts, with seasons sorted
+    """
+    seasons = sorted(metadata['seasons'])
+    uL_per_field = 0.5 / 200.0  # from Garki PDF - page 111 - 0.5 uL per 200 views
+    pfpr_edges = 1 - np.exp(-np.asarray(metadata['parasitemia_bins'], dtype=float) * uL_per_field)
+    age_edges = np.asarray(metadata['age_bins'], dtype=float)
+
+    data = garki_store_columns(store, metadata['village'], ['Seasons', 'Age', channel])
+    # Season bin of each Seasons code, -1 (not counted) for other seasons and, in the last entry, for missing values
+    season_lookup = np.array([seasons.index(c) if c in seasons else -1
+                              for c in store['manifest']['columns']['Seasons']['categories']] + [-1], dtype=float)
+    season_codes = np.where(data['Seasons'] < 0, len(season_lookup) - 1, data['Seasons'])
+
+    sample = np.column_stack([season_lookup[season_codes],
+                              _right_closed_histogram_sample(data['Age']),
+                              _right_closed_histogram_sample(data[channel])])
+    edges = [np.arange(len(seasons) + 1) - 0.5,
+             -np.concatenate(([-np.inf], age_edges))[::-1],
+             -np.concatenate(([-np.inf], pfpr_edges))[::-1]]
+    counts, _ = np.histogramdd(sample, bins=edges)
+
+    return counts[:, ::-1, ::-1].astype(np.int64)
+
+
+def get_distance_rings(nodes, distances, ddf):
+    """
+    Precompute a sparse neighbor adjacency for each distance ring used by get_risk_by_distance
+    :param nodes: sequence of node IDs in the (positional) order of the simulation DataFrame rows
+    :param distances: list of right-edges of the reference distance bins, e.g. [0, 0.05, 0.2]
+    :param ddf: pandas.DataFrame of pairwise distances with columns 'node1', 'node2', 'dist',
+                or the equivalent neighbor index returned by get_neighbor_index
+    :return: list of scipy.sparse.csr_matrix (one per distance), where entry [i, j] = 1 if node j is a neighbor
+             of node i in the ring (distances[k-1], distances[k]]
+    """
+    nodes = pd.Index(nodes)
+    n = len(nodes)
+
+    if isinstance(ddf, pd.DataFrame):
+        node1, node2, dist = ddf['node1'].values, ddf['node2'].values, ddf['dist'].values
+    else:  # neighbor index from get_neighbor_index
+        node1 = np.repeat(ddf['node1'], np.diff(ddf['indptr']))
+        node2, dist = ddf['node2'], ddf['dist']
+
+    # Keep only pairs between distinct nodes that are both present in the simulation
+    row = nodes.get_indexer(node1)
+    col = nodes.get_indexer(node2)
+    valid = (row >= 0) & (col >= 0) & (node1 != node2)
+    row, col, dist = row[valid], col[valid], dist[valid]
+
+    rings = []
     for k, n_dist in enumerate(distances):
-        pos_w_pos = 0.
-        tot_w_pos = 0.
+        # N.B. first ring is bounded below by the last distance, as in the original household loop
+        in_ring = (dist <= n_dist) & (dist > distances[k - 1])
+        adjacency = sparse.csr_matrix((np.ones(in_ring.sum()), (row[in_ring], col[in_ring])), shape=(n, n))
+        adjacency.data[:] = 1  # duplicate pairs count a neighbor once
+        adjacency.sort_indices()
+        rings.append(adjacency)
+
+    return rings
+
+
+def get_risk_by_distance(df_sim, distances, ddf, rings=None):
+    """
+    Risk of being positive in each distance ring around positive households
+    :param df_sim: a pandas.DataFrame with 'node', 'pos' and 'pop' columns and a positional (0..N-1) index
+    :param distances: list of right-edges of the reference distance bins, where 0 is within-household
+    :param ddf: pairwise distances as a pandas.DataFrame or neighbor index (see get_distance_rings)
+    :param rings: optional precomputed output of get_distance_rings for the nodes of df_sim
+    :return: list of positive fractions, one per distance
+    """
+
+    if rings is None:
+        rings = get_distance_rings(df_sim['node'].values, distances, ddf)
 
-        for hh_num in df_sim.index:
-            if df_sim.ix[hh_num, 'pos'] < 1:
-                continue
+    pos = df_sim['pos'].values.astype(float)
+    pop = df_sim['pop'].values.astype(float)
+    positive_hh = ~(pos < 1)
 
-            if n_dist == 0 and df_sim.ix[hh_num, 'pop'] > 1:
-                hh_pos = df_sim.ix[hh_num, 'pos']
-                hh_tot = df_sim.ix[hh_num, 'pop']
-                num_pos = (hh_pos - 1)*hh_pos
-                num_ppl = (hh_tot - 1)*hh_pos
+    rel_risk = []
 
-            else:
-                # node IDs of nodes within distance
-                neighbors = ddf[(ddf['node1'] == nodelist[hh_num]) & (ddf['node2'] != nodelist[hh_num]) &
-                                (ddf['dist'] <= n_dist) & (ddf['dist'] > distances[k-1])]['node2'].values
+    for k, n_dist in enumerate(distances):
+        # Neighbor sums by household, only for households with positives
+        num_pos = np.where(positive_hh, rings[k].dot(pos), 0)
+        num_ppl = np.where(positive_hh, rings[k].dot(pop), 0)
 
-                ndf = df_sim[df_sim['node'].isin(neighbors)]
-                num_pos = sum(ndf['pos'].values)
-                num_ppl = sum(ndf['pop'].values)
+        if n_dist == 0:
+            within_hh = positive_hh & (pop > 1)
+            num_pos[within_hh] = ((pos - 1) * pos)[within_hh]
+            num_ppl[within_hh] = ((pop - 1) * pos)[within_hh]
 
-            pos_w_pos += num_pos
-            tot_w_pos += num_ppl
+        # Accumulate in household order to reproduce the sums of the original loop exactly
+        pos_w_pos = sum(num_pos.tolist(), 0.)
+        tot_w_pos = sum(num_ppl.tolist(), 0.)
 
         if tot_w_pos > 0:
             rel_risk.append(pos_w_pos/tot_w_pos)
@@ -387,33 +1170,41 @@ def get_risk_by_distance(df_sim, distances, ddf):
 
 def ento_data(csvfilename, metadata):
 
-    df = pd.read_csv(csvfilename)
+    df = mosquito_counts_per_adult(csvfilename)
+
+    return monthly_species_means(df, metadata['species'], ['Month'])
 
+
+def mosquito_counts_per_adult(csvfilename):
+    """
+    Read a household mosquito count csv file into gambiae and funestus counts per adult in the house, by Month
+    :param csvfilename: csv file with 'date', 'gambiae_count', 'funestus_count' and 'adult_house' columns
+    :return: pandas.DataFrame of the rows without missing values, with 'gambiae', 'funestus' and 'Month' columns added
+    """
+    df = pd.read_csv(csvfilename, usecols=['date', 'gambiae_count', 'funestus_count', 'adult_house'])
     df = df[['date', 'gambiae_count', 'funestus_count', 'adult_house']]
-    df['gambiae'] = df['gambiae_count'] / df['adult_house']
-    df['funestus'] = df['funestus_count'] / df['adult_house']
+    df = df.assign(gambiae=df['gambiae_count'] / df['adult_house'], funestus=df['funestus_count'] / df['adult_house'])
     df = df.dropna()
 
-    df['date'] = pd.to_datetime(df['date'])
-    dateparser = lambda x: int(x.strftime('%m'))
-    df['Month'] = df['date'].apply(lambda x: int(dateparser(x)))
-    df2 = df.groupby('Month')['gambiae'].apply(np.mean).reset_index()
-    df2['funestus'] = list(df.groupby('Month')['funestus'].apply(np.mean))
-
-    # Keep only species requested
-    for spec in metadata['species']:
-        df1 = df2[['Month', spec]]
-        df1 = df1.rename(columns={spec: 'Counts'})
-        df1['Channel'] = [spec] * len(df1)
-        if 'dftemp' in locals():
-            dftemp = pd.concat([dftemp, df1])
-        else:
-            dftemp = df1.copy()
+    # Parse each distinct date once: multi-year files repeat the same survey days over many households
+    codes, dates = pd.factorize(df['date'])
+    df['Month'] = pd.to_datetime(pd.Series(dates)).dt.month.values.astype(np.int64)[codes]
 
-    dftemp = dftemp.sort_values(['Channel', 'Month'])
-    dftemp = dftemp.set_index(['Channel', 'Month'])
+    return df
 
-    return dftemp
+
+def monthly_species_means(df, species, groups):
+    """
+    Mean of the species columns by group, in one groupby, with the species melted into a Channel index level
+    :param df: pandas.DataFrame with the species and group columns
+    :param species: list of species columns, e.g. ['gambiae', 'funestus']
+    :param groups: list of group columns, e.g. ['Month'] or ['Month', 'NodeID']
+    :return: pandas.DataFrame of 'Counts' indexed on ['Channel'] + groups, sorted
+    """
+    means = df.groupby(groups)[list(species)].mean().reset_index()
+    dftemp = pd.melt(means, id_vars=groups, value_vars=list(species), var_name='Channel', value_name='Counts')
+    dftemp = dftemp.sort_values(['Channel'] + groups, kind='mergesort')
+    return dftemp.set_index(['Channel'] + groups)
 
 
 def garki_ento_data(csvfilename, metadata):
@@ -468,86 +1259,49 @@ def hhs_to_nodes(csvfilename, hhs_file, metadata):
         all_hh_records.lat < y_max)]
 
     # get point locations of households
-    points = hh_records.as_matrix(["lon", "lat"])
+    points = hh_records[["lon", "lat"]].values
 
     # get number of grid cells along the x (grid width) and y axis (grid height) based on the bounding box dimensions and pixel/cell size
-    num_cells_x = int(1000 * vincenty((y_min, x_min), (y_min, x_max)).km / cell_size) + 1
-    num_cells_y = int(1000 * vincenty((y_min, x_min), (y_max, x_min)).km / cell_size) + 1
+    num_cells_x = int(1000 * haversine_km(y_min, x_min, y_min, x_max) / cell_size) + 1
+    num_cells_y = int(1000 * haversine_km(y_min, x_min, y_max, x_min) / cell_size) + 1
 
     # bin households in the grid
     H, xedges, yedges = np.histogram2d(points[:, 0], points[:, 1], bins=[num_cells_x, num_cells_y])
 
-    # get centroids of grid cells
-    x_mid = (xedges[1:] + xedges[:-1]) / 2
-    y_mid = (yedges[1:] + yedges[:-1]) / 2
-
-    # build a mesh of centroids
-    X_mid, Y_mid = np.meshgrid(x_mid[:], y_mid[:])
-
-    # filter pixels/cells by number of households greater than a threshold in each cell
-    cells_masking = ma.masked_less(H, cell_household_threshold)
-    cells_mask = cells_masking.mask
-
-    # mask returns False for valid entries;  True would be easier to work with
-    inverted_filtered_households_mask = np.in1d(cells_mask.ravel(), [False]).reshape(cells_mask.shape)
-    filtered_household_cells_idx = np.where(inverted_filtered_households_mask)
+    # label the cells with more households than the threshold, in (x, y) index order
+    valid_x, valid_y = np.nonzero(H >= cell_household_threshold)
 
-    # map between node coordinates and node label; to avoid look-up logic
-    coor_idxs_2_node_label = {}
+    # each household goes to the nearest centroid of a valid cell, i.e. its own cell unless that is below the threshold.
+    # Candidates come from a KD-tree (at most 4 centroids can be equidistant), then the closest by squared distance
+    # wins, ties going to the lowest (y, x) cell index as in the original per-household mesh search
+    x_mid = ((xedges[1:] + xedges[:-1]) / 2)[valid_x]
+    y_mid = ((yedges[1:] + yedges[:-1]) / 2)[valid_y]
+    k = min(4, len(valid_x))
+    _, candidates = cKDTree(np.column_stack([x_mid, y_mid])).query(points, k=k)
+    candidates = candidates.reshape(len(points), k)
+    dist = (x_mid[candidates] - points[:, [0]]) ** 2 + (y_mid[candidates] - points[:, [1]]) ** 2
+    best = np.lexsort((valid_x[candidates], valid_y[candidates], dist), axis=1)[:, 0]
+    labels = candidates[np.arange(len(points)), best]
 
-    for i, idx_x in enumerate(filtered_household_cells_idx[0]):
-        idx_y = filtered_household_cells_idx[1][i]
+    hh_records['NodeID'] = labels.astype(str)
 
-        node_label = str(i)  # unique node label
-
-        coor_idxs_2_node_label[str(idx_x) + "_" + str(idx_y)] = node_label
-
-    node_label = [0]*len(hh_records)
-    for i in range(len(points)):
-        X = X_mid * np.transpose(inverted_filtered_households_mask)
-        Y = Y_mid * np.transpose(inverted_filtered_households_mask)
-        X[X == 0] = 'nan'
-        Y[Y == 0] = 'nan'
-        x = X_mid - points[i][0]
-        y = Y_mid - points[i][1]
-        dist = x**2 + y**2
-        neigh_cand = np.argwhere(dist == np.min(dist))
-        node_label[i] = coor_idxs_2_node_label[str(neigh_cand[0][0]) + "_" + str(neigh_cand[0][1])]
+    return hh_records
 
-    hh_records['NodeID'] =node_label
 
-    return hh_records
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km between points given in degrees (arrays are broadcast)
+    """
+    lat1, lon1, lat2, lon2 = [np.radians(v) for v in (lat1, lon1, lat2, lon2)]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
 
 
 def ento_spatial_data(datafilename, hhs_hffilename, hhs_file, metadata):
 
     # df2 = hhs_to_nodes(hhs_hffilename, hhs_file, metadata)
 
-    df = pd.read_csv(datafilename)
-
-    df = df[['date', 'gambiae_count', 'funestus_count', 'adult_house']]
-    df['gambiae'] = df['gambiae_count'] / df['adult_house']
-    df['funestus'] = df['funestus_count'] / df['adult_house']
-    df = df.dropna()
+    df = mosquito_counts_per_adult(datafilename)
     df['NodeID'] = [random.randint(0, 32) for i in range(len(df))]
 
-    df['date'] = pd.to_datetime(df['date'])
-    dateparser = lambda x: int(x.strftime('%m'))
-    df['Month'] = df['date'].apply(lambda x: int(dateparser(x)))
-    df2 = df.groupby(['Month', 'NodeID'])['gambiae'].apply(np.mean).reset_index()
-    df2['funestus'] = list(df.groupby(['Month', 'NodeID'])['funestus'].apply(np.mean))
-
-    # Keep only species requested
-    for spec in metadata['species']:
-        df1 = df2[['Month', 'NodeID',  spec]]
-        df1 = df1.rename(columns={spec: 'Counts'})
-        df1['Channel'] = [spec] * len(df1)
-        if 'dftemp' in locals():
-            dftemp = pd.concat([dftemp, df1])
-        else:
-            dftemp = df1.copy()
-
-    dftemp = dftemp.sort_values(['Channel', 'Month', 'NodeID'])
-    dftemp = dftemp.set_index(['Channel', 'Month', 'NodeID'])
-
-    return dftemp
\ No newline at end of file
+    return monthly_species_means(df, metadata['species'], ['Month', 'NodeID'])
@@ -1,10 +1,14 @@
 
 import logging
+import os
 
+import numpy as np
 import pandas as pd
 
 from calibtool import LL_calculators
-from calibtool.analyzers.Helpers import get_spatial_report_data_at_date, get_risk_by_distance
+from malaria.analyzers.Helpers import get_risk_by_distance, get_distance_rings, get_spatial_report_data_at_date
+from malaria.analyzers.ReplicateAccumulator import ReplicateAccumulator
+from malaria.analyzers.batch_LL_calculators import get_batch_calculator, propagate_missing
 from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer
 
 
@@ -24,9 +28,21 @@ class PositiveFractionByDistanceAnalyzer(BaseCalibrationAnalyzer):
     def __init__(self, site, weight=1, compare_fn=LL_calculators.euclidean_distance, **kwargs):
         super(PositiveFractionByDistanceAnalyzer, self).__init__(site, weight, compare_fn)
         self.testday = kwargs.get('testday')
+        # Vectorized likelihood: batch_compare_fn(ref, sim) with ref (distances) and sim (samples x distances) arrays,
+        # returning one value per sample and skipping missing values; by default the batched compare_fn if any.
+        # As with compare, samples missing a distance score NaN.
+        self.batch_compare_fn = kwargs.get('batch_compare_fn', get_batch_calculator(compare_fn))
         self.reference = site.get_reference_data('risk_by_distance')
         self.ignore_nodes = site.get_ignore_node_list()
         self.distmat = site.get_distance_matrix()
+        self.rings = {}  # distance-ring adjacency by tuple of simulation node IDs
+        self.accumulator = ReplicateAccumulator()  # running replicate sums by sample
+
+        # Optionally read only the testday from the spatial reports on disk instead of parsing whole channels
+        self.spatial_reports = self.filenames
+        self.stream_spatial_reports = kwargs.get('stream_spatial_reports', False)
+        if self.stream_spatial_reports:
+            self.filenames = []
 
     def filter(self, sim_metadata):
         '''
@@ -40,9 +56,14 @@ class PositiveFractionByDistanceAnalyzer(BaseCalibrationAnalyzer):
         '''
         Extract data from output data and measure risk of RDT+ by distance from RDT+.
         '''
-        prev_data = get_spatial_report_data_at_date(parser.raw_data[self.filenames[0]], self.testday)
+        if self.stream_spatial_reports:
+            sp_data = [os.path.join(parser.sim_dir, f) for f in self.spatial_reports]
+        else:
+            sp_data = [parser.raw_data[f] for f in self.filenames]
+
+        prev_data = get_spatial_report_data_at_date(sp_data[0], self.testday)
         prev_data.rename(columns={ 'data' : 'prev' }, inplace=True )
-        pop_data = get_spatial_report_data_at_date(parser.raw_data[self.filenames[1]], self.testday)
+        pop_data = get_spatial_report_data_at_date(sp_data[1], self.testday)
         pop_data.rename(columns={ 'data' : 'pop' } , inplace=True)
         df = pd.merge(prev_data, pop_data, on='node')
 
@@ -53,7 +74,7 @@ class PositiveFractionByDistanceAnalyzer(BaseCalibrationAnalyzer):
         df['pos'] = df['prev']*df['pop']
         ref_distance = self.reference['distances']
         
-        positive_fraction = get_risk_by_distance(df, ref_distance, self.distmat)
+        positive_fraction = get_risk_by_distance(df, ref_distance, self.distmat, rings=self.get_rings(df['node']))
         
         channel_data = pd.DataFrame({ self.y : positive_fraction + [df['pos'].sum()/df['pop'].sum()]},
                                       index=ref_distance+[1000])
@@ -61,20 +82,35 @@ class PositiveFractionByDistanceAnalyzer(BaseCalibrationAnalyzer):
         channel_data.index.name = self.x
         channel_data.sample = parser.sim_data.get('__sample_index__')
         channel_data.sim_id = parser.sim_id
+        self.accumulator.add(channel_data.sample, channel_data)
 
         return channel_data
 
+    def get_rings(self, nodes):
+        '''
+        Distance-ring adjacency for the given nodes, computed once and shared by all simulations of the site.
+        '''
+        key = tuple(nodes)
+        if key not in self.rings:
+            self.rings[key] = get_distance_rings(nodes.values, self.reference['distances'], self.distmat)
+        return self.rings[key]
+
     def combine(self, parsers):
         '''
         Combine the simulation data into a single table for all analyzed simulations.
         '''
 
-        selected = [p.selected_data[id(self)] for p in parsers.values() if id(self) in p.selected_data]
-        combined = pd.concat(selected, axis=1,
-                             keys=[(d.sample, d.sim_id) for d in selected],
-                             names=self.data_group_names)
-        stacked = combined.stack(['sample', 'sim_id'])
-        self.data = stacked.groupby(level=['sample', self.x]).mean()
+        # Replicates were averaged as they were analyzed; add any results that did not pass through apply
+        for p in parsers.values():
+            if id(self) in p.selected_data:
+                d = p.selected_data[id(self)]
+                self.accumulator.add(d.sample, d)
+
+        means = self.accumulator.means()
+        self.accumulator.reset()
+
+        self.data = pd.concat(means.values(), keys=means.keys(), names=['sample'])
+        self.data.columns.name = 'channel'
         logger.debug(self.data)
 
     def compare(self, sample):
@@ -85,11 +121,22 @@ class PositiveFractionByDistanceAnalyzer(BaseCalibrationAnalyzer):
         return self.compare_fn(self.reference['risks'] + [self.reference['prevalence']],
                                sample[self.y].tolist())
 
+    def batch_compare(self):
+        '''
+        Assess all samples at once, as a single (samples x distances) array against the reference.
+        '''
+        sim = self.data[self.y].unstack(self.x).reindex(columns=self.reference['distances'] + [1000])
+        ref = np.array(self.reference['risks'] + [self.reference['prevalence']])
+        return pd.Series(propagate_missing(self.batch_compare_fn(ref, sim.values), ref, sim.values), index=sim.index)
+
     def finalize(self):
         '''
         Calculate the output result for each sample.
         '''
-        self.result = self.data.groupby(level='sample').apply(self.compare)
+        if self.batch_compare_fn:
+            self.result = self.batch_compare()
+        else:
+            self.result = self.data.groupby(level='sample').apply(self.compare)
         logger.debug(self.result)
 
     def cache(self):
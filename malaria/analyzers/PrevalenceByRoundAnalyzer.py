@@ -1,10 +1,14 @@
 
 import logging
+import operator
 
+import numpy as np
 import pandas as pd
 
 from calibtool import LL_calculators
 from calibtool.analyzers.BaseCalibrationAnalyzer import BaseCalibrationAnalyzer
+from malaria.analyzers.ReplicateAccumulator import ReplicateAccumulator
+from malaria.analyzers.batch_LL_calculators import get_batch_calculator, propagate_missing
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +24,18 @@ class PrevalenceByRoundAnalyzer(BaseCalibrationAnalyzer):
     def __init__(self, site, weight=1, compare_fn=LL_calculators.euclidean_distance, **kwargs):
         super(PrevalenceByRoundAnalyzer, self).__init__(site, weight, compare_fn)
         self.reference = site.get_reference_data('prevalence_by_round')
-        self.refdf = pd.DataFrame(self.reference)
+        self.refdf = pd.DataFrame(self.reference)  # read-only once constructed: shared by concurrent apply calls
         self.regions = site.get_region_list()
+        # Positions of the survey rounds in the report time series (each round once, however many regions
+        # it was surveyed in), and reference prevalence by region on those rounds, NaN where a region has none
+        self.sim_date_index = np.unique(self.refdf['sim_date'].values).astype(np.int64)
+        self.ref_prev = dict((region, self.refdf[self.refdf['grid_cell'] == region].set_index('sim_date')['prev']
+                                                .reindex(self.sim_date_index).values.astype(float))
+                             for region in self.regions)
+        # Vectorized likelihood: batch_compare_fn(ref, sim) with ref (rounds) and sim (samples x rounds) arrays,
+        # returning one value per sample and skipping missing values; by default the batched compare_fn if any.
+        # As with compare, samples missing a surveyed round score NaN.
+        self.batch_compare_fn = kwargs.get('batch_compare_fn', get_batch_calculator(compare_fn))
         # self.regions = self.reference['grid_cell'].unique()
         self.filenames = ['output/ReportMalariaFiltered.json']
         region_filenames = ['output/ReportMalariaFiltered' + x + '.json' for x in self.regions if x != 'all']
@@ -30,6 +44,7 @@ class PrevalenceByRoundAnalyzer(BaseCalibrationAnalyzer):
             # self.regions.insert(0, self.regions.pop(self.regions.index('all')))
         else :
             self.filenames = region_filenames
+        self.accumulator = ReplicateAccumulator()  # running replicate sums by sample
 
     def filter(self, sim_metadata):
         '''
@@ -43,35 +58,17 @@ class PrevalenceByRoundAnalyzer(BaseCalibrationAnalyzer):
         '''
         Extract data from output data
         '''
-        dfs = []
-        set_N = False
-        if 'N' not in self.refdf.columns:
-            set_N = True
-            Ndf = pd.DataFrame()
-
-        for i, region in enumerate(self.regions) :
-            data = [parser.raw_data[self.filenames[i]]['Channels'][self.y]['Data'][x] for x in self.refdf['sim_date'].values]
-            pop = [parser.raw_data[self.filenames[i]]['Channels']['Statistical Population']['Data'][x] for x in self.refdf['sim_date'].values]
-
-            df = pd.DataFrame({ self.y: data},
-                                index=self.refdf['sim_date'].values)
-            df.region = region
-            df.index.name = 'sim_date'
-            dfs.append(df)
-
-            if set_N :
-                t = pd.DataFrame({ 'grid_cell' : [region]*len(pop),
-                                   'N' : pop})
-                t['sim_date'] = self.refdf['sim_date']
-                Ndf = pd.concat([Ndf, t])
-
-        if set_N :
-            self.refdf = pd.merge(left=self.refdf, right=Ndf, on=['grid_cell', 'sim_date'])
-
-        c = pd.concat(dfs, axis=1, keys=self.regions, names=['region'])
-        channel_data = c.stack(['region'])
+        # (region x round) array of the channel, picking the rounds out of each region's time series
+        # without converting the whole series to an array
+        rounds = operator.itemgetter(*self.sim_date_index.tolist())
+        data = np.array([rounds(parser.raw_data[filename]['Channels'][self.y]['Data']) for filename in self.filenames])
+        data = data.reshape(len(self.filenames), len(self.sim_date_index))
+
+        index = pd.MultiIndex.from_product([self.sim_date_index, self.regions], names=['sim_date', 'region'])
+        channel_data = pd.DataFrame({self.y: data.T.ravel()}, index=index)
         channel_data.sample = parser.sim_data.get('__sample_index__')
         channel_data.sim_id = parser.sim_id
+        self.accumulator.add(channel_data.sample, channel_data)
 
         return channel_data
 
@@ -79,12 +76,18 @@ class PrevalenceByRoundAnalyzer(BaseCalibrationAnalyzer):
         '''
         Combine the simulation data into a single table for all analyzed simulations.
         '''
-        selected = [p.selected_data[id(self)] for p in parsers.values() if id(self) in p.selected_data]
-        combined = pd.concat(selected, axis=1,
-                             keys=[(d.sample, d.sim_id) for d in selected],
-                             names=self.data_group_names)
-        stacked = combined.stack(['sample', 'sim_id'])
-        self.data = stacked.groupby(level=['sample', 'region', 'sim_date']).mean()
+        # Replicates were averaged as they were analyzed; add any results that did not pass through apply
+        for p in parsers.values():
+            if id(self) in p.selected_data:
+                d = p.selected_data[id(self)]
+                self.accumulator.add(d.sample, d)
+
+        means = self.accumulator.means()
+        self.accumulator.reset()
+
+        self.data = pd.concat(means.values(), keys=means.keys(), names=['sample'])\
+                      .reorder_levels(['sample', 'region', 'sim_date']).sort_index()
+        self.data.columns.name = 'channel'
         logger.debug(self.data)
 
     def compare(self, sample):
@@ -92,14 +95,33 @@ class PrevalenceByRoundAnalyzer(BaseCalibrationAnalyzer):
         Assess the result per sample, in this case the likelihood
         comparison between simulation and reference data.
         '''
-        return sum([self.compare_fn(self.refdf[self.refdf['grid_cell']==region]['prev'].values,
-                                    df[self.y].tolist()) for (region, df) in sample.groupby(level='region')])
+        result = 0
+        for region, df in sample.groupby(level='region'):
+            ref = self.ref_prev[region]
+            surveyed = ~np.isnan(ref)  # rounds with reference data in this region
+            result += self.compare_fn(ref[surveyed], df[self.y].values[surveyed].tolist())
+        return result
+
+    def batch_compare(self):
+        '''
+        Assess all samples at once, summing over regions a single (samples x rounds) comparison per region.
+        '''
+        result = 0
+        for region, df in self.data[self.y].groupby(level='region'):
+            sim = df.reset_index(level='region', drop=True).unstack('sim_date')
+            ref = self.ref_prev[region]
+            scores = propagate_missing(self.batch_compare_fn(ref, sim.values), ref, sim.values)
+            result = result + pd.Series(scores, index=sim.index)
+        return result
 
     def finalize(self):
         '''
         Calculate the output result for each sample.
         '''
-        self.result = self.data.groupby(level='sample').apply(self.compare)
+        if self.batch_compare_fn:
+            self.result = self.batch_compare()
+        else:
+            self.result = self.data.groupby(level='sample').apply(self.compare)
         logger.debug(self.result)
 
     def cache(self):
@@ -0,0 +1,81 @@
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Tokens marking the DataFrames added to an accumulator since its construction or last reset
+_tokens = itertools.count()
+
+
+class ReplicateAccumulator(object):
+    """
+    Running sums and counts of simulation output per (sample, bin), so that replicates can be averaged
+    as each simulation is analyzed instead of concatenating every simulation before a groupby-mean.
+    Memory is O(bins x samples) however many replicates are added.
+    """
+
+    def __init__(self):
+        self.sums = {}
+        self.counts = {}
+        self.added = 0
+        self.token = next(_tokens)
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # The lock cannot be pickled or copied: analyzers owning an accumulator are, so each copy gets its own
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add(self, sample, df):
+        """
+        Add one simulation's output to the running sums and counts of its sample.
+        The DataFrame is marked as added until the next reset, so that results may be added from apply
+        and again in combine.
+        :param sample: the sample index of the simulation
+        :param df: pandas.DataFrame of simulation output (bins x channels) with a unique index
+        """
+        if not df.index.is_unique:
+            raise ValueError('Simulation output of sample %s has duplicate bins: %s'
+                             % (sample, df.index[df.index.duplicated()].unique().tolist()))
+
+        values = df.fillna(0)
+        counts = df.notnull().astype(int)
+
+        with self.lock:
+            if getattr(df, 'accumulator_token', None) == self.token:
+                return
+            df.accumulator_token = self.token
+            self.added += 1
+
+            if sample in self.sums:
+                self.sums[sample] = self.sums[sample].add(values, fill_value=0)
+                self.counts[sample] = self.counts[sample].add(counts, fill_value=0)
+            else:
+                self.sums[sample] = values
+                self.counts[sample] = counts
+
+    def means(self):
+        """
+        The mean over replicates of each sample, skipping missing values as in groupby(...).mean()
+        :return: OrderedDict of sample to pandas.DataFrame (bins x channels), sorted by sample
+        """
+        with self.lock:
+            return OrderedDict((sample, self.sums[sample] / self.counts[sample].where(self.counts[sample] > 0))
+                               for sample in sorted(self.sums))
+
+    def reset(self):
+        with self.lock:
+            self.sums, self.counts, self.added = {}, {}, 0
+            self.token = next(_tokens)
+
+    def __len__(self):
+        return self.added
@@ -0,0 +1,52 @@
+import numpy as np
+
+from calibtool import LL_calculators
+
+
+def batch_euclidean_distance(ref, sim):
+    """
+    Vectorized LL_calculators.euclidean_distance, evaluating all samples at once
+    :param ref: reference array, (bins) or (bins x channels)
+    :param sim: simulation array, (samples x bins) or (samples x bins x channels)
+    :return: array of the negative Euclidean distance of each sample to the reference over non-missing bins
+    """
+    ref = np.asarray(ref, dtype=float)[np.newaxis]
+    sim = np.asarray(sim, dtype=float)
+    channel_axes = tuple(range(2, sim.ndim))
+
+    # Bins missing from either side are left out, as join_reference(...).dropna() does for a single sample:
+    # a bin is dropped when any of its channels is missing from the reference or the sample
+    valid = ~(np.isnan(ref) | np.isnan(sim)).any(axis=channel_axes)
+    squares = np.nansum((sim - ref) ** 2, axis=channel_axes)
+
+    return -np.sqrt(np.where(valid, squares, 0).sum(axis=1))
+
+
+def propagate_missing(scores, ref, sim):
+    """
+    Scores of samples missing a simulation value in a bin of the reference set to NaN, as the per-sample
+    likelihoods give when called on the whole series rather than on join_reference(...).dropna()
+    :param scores: array of one score per sample, e.g. from batch_euclidean_distance
+    :param ref: reference array, (bins) or (bins x channels)
+    :param sim: simulation array, (samples x bins) or (samples x bins x channels)
+    :return: array of scores
+    """
+    ref = np.asarray(ref, dtype=float)[np.newaxis]
+    sim = np.asarray(sim, dtype=float)
+    missing = (np.isnan(sim) & ~np.isnan(ref)).reshape(len(sim), -1).any(axis=1)
+    return np.where(missing, np.nan, np.asarray(scores, dtype=float))
+
+
+# Batched equivalent of each per-sample likelihood, used by default when an analyzer is given that likelihood
+batch_calculators = {LL_calculators.euclidean_distance: batch_euclidean_distance}
+
+
+def get_batch_calculator(compare_fn):
+    """
+    :param compare_fn: per-sample likelihood of an analyzer, e.g. LL_calculators.euclidean_distance
+    :return: its batched equivalent, or None if there is none
+    """
+    try:
+        return batch_calculators.get(compare_fn)
+    except TypeError:  # unhashable callable
+        return None
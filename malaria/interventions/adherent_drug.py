@@ -1,4 +1,4 @@
-from malaria.interventions.malaria_drugs import drug_params
+from malaria.interventions.malaria_drugs import install_drug_params
 
 
 def configure_adherent_drug(cb, cost=1, doses=[], dose_interval=1,
@@ -77,16 +77,10 @@ def configure_adherent_drug(cb, cost=1, doses=[], dose_interval=1,
                  ['Amodiaquine'],
                  ['Amodiaquine']]
 
-    already_added = []
-    for dose in doses:
-        for drug in dose:
-            if drug not in already_added:
-                cb.config["parameters"]["Malaria_Drug_Params"][drug] = drug_params[drug]
-                already_added.append(drug)
+    install_drug_params(cb, [drug for dose in doses for drug in dose])
 
     cb.set_param("PKPD_Model", "CONCENTRATION_VERSUS_TIME")
 
-    cb.config["parameters"]["Malaria_Drug_Params"][drug] = drug_params[drug]
     adherent_drug = {
             "class": "AdherentDrug",
             "Cost_To_Consumer": cost,
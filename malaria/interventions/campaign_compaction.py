@@ -0,0 +1,286 @@
+import json
+from collections import OrderedDict, defaultdict
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+
+repetition_keys = ('Number_Repetitions', 'Timesteps_Between_Repetitions')
+
+
+def start_day_runs(days):
+    """
+    Split distribution days into arithmetic series that a single event can express with
+    Number_Repetitions and (integer) Timesteps_Between_Repetitions.
+    :param days: list of distribution days; a day listed twice goes into two runs
+    :return: list of (start_day, number_repetitions, timesteps_between_repetitions) tuples in start-day order,
+             where the step of a single-day run is None
+    """
+    runs = []
+    remaining = sorted(days)
+    while remaining:
+        run, rest = [remaining[0]], []
+        for day in remaining[1:]:
+            step = day - run[-1]
+            if step > 0 and step == int(step) and (len(run) == 1 or step == run[1] - run[0]):
+                run.append(day)
+            else:
+                rest.append(day)
+        runs.append((run[0], len(run), int(run[1] - run[0]) if len(run) > 1 else None))
+        remaining = rest
+    return runs
+
+
+def distribution_days(start_days, repetitions=1, interval=0):
+    """
+    Days on which events starting on start_days, repeated every interval, distribute their interventions.
+    Events repeating indefinitely (negative repetitions) have no finite list of days.
+    """
+    if repetitions < 0:
+        raise ValueError('Unable to list the distribution days of events repeating indefinitely '
+                         '(Number_Repetitions=%s)' % repetitions)
+    return [start_day + rep * interval for start_day in start_days for rep in range(max(repetitions, 1))]
+
+
+def event_distribution_days(event):
+    """
+    Distribution days of a campaign event, or None if it repeats indefinitely
+    """
+    coordinator = event.get('Event_Coordinator_Config', {})
+    repetitions = coordinator.get('Number_Repetitions', 1)
+    if repetitions < 0:
+        return None
+    interval = coordinator.get('Timesteps_Between_Repetitions', 0) if repetitions > 1 else 0
+    return distribution_days([event.get('Start_Day', 0)], repetitions, interval)
+
+
+def event_nodes(event):
+    """
+    Set of targeted node IDs of a campaign event, or None for all nodes
+    """
+    nodeset = event.get('Nodeset_Config', {})
+    if nodeset.get('class') == 'NodeSetNodeList':
+        return set(nodeset['Node_List'])
+    return None
+
+
+def event_signature(event, drop_keys=(), drop_coordinator_keys=()):
+    """
+    Canonical string of a campaign event without the specified (coordinator) keys, for finding mergeable events
+    """
+    event = dict((k, v) for k, v in event.items() if k not in drop_keys)
+    coordinator = event.get('Event_Coordinator_Config', {})
+    event['Event_Coordinator_Config'] = dict((k, v) for k, v in coordinator.items() if k not in drop_coordinator_keys)
+    return json.dumps(event, sort_keys=True)
+
+
+class _Footprints(object):
+    """
+    Distribution days and nodes of the events in a campaign, used to check that merging an event
+    does not change the order in which different interventions reach the same node on the same day.
+    """
+
+    def __init__(self, events, keys):
+        self.keys = keys
+        self.nodes = [event_nodes(e) for e in events]
+        self.days = [event_distribution_days(e) for e in events]
+        self.by_day = defaultdict(list)  # day -> sorted event positions
+        self.indefinite = []  # positions of indefinitely repeating events
+        for i, days in enumerate(self.days):
+            if days is None:
+                self.indefinite.append(i)
+            else:
+                for day in set(days):
+                    self.by_day[day].append(i)
+
+    def conflict(self, i, j):
+        """ Whether events i and j distribute different interventions to a common node """
+        if i == j or (self.keys[i] is not None and self.keys[i] == self.keys[j]):
+            return False
+        return self.nodes[i] is None or self.nodes[j] is None or bool(self.nodes[i] & self.nodes[j])
+
+    def same_day(self, i, positions=None):
+        """ Positions of other events distributing on any of the days of event i (optionally within positions) """
+        if self.days[i] is None:
+            candidates = range(len(self.days))
+        else:
+            candidates = set(self.indefinite)
+            for day in set(self.days[i]):
+                candidates.update(self.by_day[day])
+        return [j for j in candidates if positions is None or j in positions]
+
+    def can_move(self, i, to):
+        """ Whether event i can move up to position 'to', past any same-day events in between """
+        return not any(self.conflict(i, j) for j in self.same_day(i, range(to + 1, i)))
+
+    def is_isolated(self, i):
+        """ Whether no different intervention reaches the nodes of event i on any of its days """
+        return not any(self.conflict(i, j) for j in self.same_day(i))
+
+
+def merge_node_lists(events):
+    """
+    Merge events that differ only in their NodeSetNodeList into one event over the union of the nodes.
+    Events are only merged when their node lists are disjoint, so that no node receives an intervention
+    a different number of times, and when that does not reorder same-day distributions to any node.
+    :param events: list of campaign event dicts
+    :return: list of campaign event dicts, each merged event at the position of its first member
+    """
+    keys = [event_signature(e, drop_keys=('Nodeset_Config',)) if event_nodes(e) is not None else None
+            for e in events]
+    footprints = _Footprints(events, keys)
+    groups = []  # [first position, merged event, merged node set]
+    latest = {}  # signature -> index in groups
+
+    for i, event in enumerate(events):
+        nodes, key = footprints.nodes[i], keys[i]
+        group = groups[latest[key]] if key in latest else None
+
+        if group and not (group[2] & nodes) and footprints.can_move(i, group[0]):
+            group[1]['Nodeset_Config']['Node_List'] += event['Nodeset_Config']['Node_List']
+            group[2] |= nodes
+            continue
+
+        if key is not None:
+            event = dict(event, Nodeset_Config=dict(event['Nodeset_Config'],
+                                                    Node_List=list(event['Nodeset_Config']['Node_List'])))
+            latest[key] = len(groups)
+        groups.append([i, event, set(nodes or [])])
+
+    return [group[1] for group in groups]
+
+
+def merge_start_day_series(events):
+    """
+    Merge events that differ only in their start day (and repetitions) into as few events as possible,
+    using Number_Repetitions and Timesteps_Between_Repetitions for each arithmetic series of distribution days.
+    As repetitions of an event are distributed before events starting on the same day, only events whose nodes
+    receive no other intervention on their days are merged.
+    Only StandardInterventionDistributionEventCoordinator events with a finite number of repetitions are merged.
+    :param events: list of campaign event dicts
+    :return: list of campaign event dicts, each merged series at the position of its first member
+    """
+    def series_key(event):
+        coordinator = event.get('Event_Coordinator_Config', {})
+        if coordinator.get('class') != 'StandardInterventionDistributionEventCoordinator' \
+                or event_distribution_days(event) is None:
+            return None
+        return event_signature(event, drop_keys=('Start_Day',), drop_coordinator_keys=repetition_keys)
+
+    keys = [series_key(e) for e in events]
+    footprints = _Footprints(events, keys)
+    groups = OrderedDict()  # signature (or position of an unmergeable event) -> [event, distribution days]
+
+    for i, event in enumerate(events):
+        key = keys[i]
+        if key is None or not footprints.is_isolated(i):
+            groups[i] = [event, None]
+        elif key in groups:
+            groups[key][1].extend(footprints.days[i])
+        else:
+            groups[key] = [event, list(footprints.days[i])]
+
+    compacted = []
+    for event, days in groups.values():
+        if days is None or days == event_distribution_days(event):
+            compacted.append(event)
+            continue
+
+        for start_day, repetitions, interval in start_day_runs(days):
+            coordinator = dict((k, v) for k, v in event['Event_Coordinator_Config'].items()
+                               if k not in repetition_keys)
+            if repetitions > 1:
+                coordinator['Number_Repetitions'] = repetitions
+                coordinator['Timesteps_Between_Repetitions'] = interval
+            compacted.append(dict(event, Start_Day=start_day, Event_Coordinator_Config=coordinator))
+
+    return compacted
+
+
+def compact_events(events):
+    """
+    Campaign compaction: merge events with identical interventions that differ only in node list,
+    or that form arithmetic start-day series, without changing who receives what on which day
+    (or the order of distributions to a node within a day).
+    The input events are not modified.
+    :param events: list of campaign event dicts
+    :return: compacted list of campaign event dicts
+    """
+    return merge_start_day_series(merge_node_lists(deepcopy(events)))
+
+
+def _greedy_clusters(values, width):
+    """
+    Labels of sorted values split greedily into the fewest clusters whose span is at most width,
+    with missing values (sorted last) in a cluster of their own
+    """
+    labels = np.empty(len(values), dtype=int)
+    label, start = 0, values[0]
+    for i, value in enumerate(values):
+        if value - start > width or (np.isnan(value) and not np.isnan(start)):
+            label, start = label + 1, value
+        labels[i] = label
+    return labels
+
+
+def cluster_deployments(deployments, params=None, tolerance=0, node_col='node', day_col='simday'):
+    """
+    Cluster per-node intervention deployments into node-list events: deployments on the same day whose parameters
+    are all within tolerance of a common value are deployed together with that value.
+    Each numeric parameter is split in turn (within the clusters of the previous ones) into the fewest groups
+    spanning at most 2 x tolerance, represented by their midrange; other parameters must match exactly.
+    :param deployments: tidy pandas.DataFrame with one row per (day, node) deployment and a column per parameter
+    :param params: list of parameter columns (default: all columns other than node_col, day_col and 'fulldate')
+    :param tolerance: maximum absolute change of any parameter, or a dict of parameter to tolerance (default 0)
+    :param node_col: column of node IDs
+    :param day_col: column of deployment days
+    :return: (clusters, report) where clusters is a pandas.DataFrame with day_col, the parameters, node_col
+             (list of node IDs) and 'n_deployments' per event, and report is a dict with the number of
+             deployments and events, and the maximum change of each parameter
+    """
+    if params is None:
+        params = [c for c in deployments.columns if c not in (node_col, day_col, 'fulldate')]
+    if not isinstance(tolerance, dict):
+        tolerance = dict((param, tolerance) for param in params)
+
+    df = deployments[[day_col, node_col] + list(params)].reset_index(drop=True)
+    clustered = df.copy()
+    # Missing parameter values are grouped like any other value, rather than given the ngroup label -1
+    key = df.groupby([day_col] + [p for p in params if not pd.api.types.is_numeric_dtype(df[p])],
+                     sort=False, dropna=False).ngroup()
+
+    for param in params:
+        if not pd.api.types.is_numeric_dtype(df[param]) or df.empty:
+            continue
+        if not tolerance.get(param, 0):
+            key = pd.Series(pd.DataFrame({'key': key.values, param: df[param].values})
+                            .groupby(['key', param], dropna=False).ngroup())
+            continue
+        order = np.lexsort((df[param].values, key.values))
+        labels = np.empty(len(df), dtype=int)
+        sorted_keys, sorted_values = key.values[order], df[param].values[order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        offset = 0
+        for positions, values in zip(np.split(np.arange(len(order)), boundaries), np.split(sorted_values, boundaries)):
+            group_labels = _greedy_clusters(values, 2 * tolerance.get(param, 0))
+            labels[order[positions]] = group_labels + offset
+            offset += group_labels[-1] + 1
+        key = pd.Series(labels)
+        grouped = df[param].groupby(key)
+        midrange = (grouped.transform('min') + grouped.transform('max')) / 2.
+        clustered[param] = midrange
+
+    # cluster labels are 0..n-1: split the rows of each cluster out of the rows sorted by label
+    order = np.argsort(key.values, kind='mergesort')
+    sizes = np.bincount(key.values.astype(int), minlength=0)
+    starts = np.cumsum(sizes) - sizes
+    clusters = clustered.iloc[order[starts]][[day_col] + list(params)].reset_index(drop=True)
+    clusters[node_col] = [nodes.tolist() for nodes in np.split(df[node_col].values[order], starts[1:])] if len(df) else []
+    clusters['n_deployments'] = sizes
+    clusters = clusters.sort_values(day_col, kind='mergesort').reset_index(drop=True)
+
+    report = {'n_deployments': len(df),
+              'n_events': len(clusters),
+              'max_distortion': dict((param, float((clustered[param] - df[param]).abs().max()) if len(df) else 0.)
+                                     for param in params if pd.api.types.is_numeric_dtype(df[param]))}
+    return clusters, report
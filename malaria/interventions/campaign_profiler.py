@@ -0,0 +1,156 @@
+import importlib
+import json
+import logging
+import os
+import sys
+from collections import Counter, OrderedDict
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+profiled_builders = [('malaria.interventions.malaria_drug_campaigns', 'add_drug_campaign'),
+                     ('malaria.interventions.health_seeking', 'add_health_seeking'),
+                     ('malaria.interventions.malaria_vaccine', 'add_vaccine'),
+                     ('malaria.interventions.malaria_diagnostic', 'add_diagnostic_survey'),
+                     ('malaria.interventions.irs', 'add_reactive_node_IRS'),
+                     ('malaria.interventions.adherent_drug', 'configure_adherent_drug'),
+                     ('dtk.interventions.health_seeking', 'add_health_seeking')]
+
+
+def nesting_depth(obj):
+    """ Depth of nested dicts and lists in a campaign object (0 for a scalar) """
+    if isinstance(obj, dict):
+        return 1 + max([nesting_depth(v) for v in obj.values()] or [0])
+    if isinstance(obj, list):
+        return 1 + max([nesting_depth(v) for v in obj] or [0])
+    return 0
+
+
+def is_structural_class(name):
+    """ Whether a campaign class is an event, event coordinator or node set rather than an intervention """
+    return name == 'CampaignEvent' or name.endswith('EventCoordinator') or name.startswith('NodeSet')
+
+
+def walk_configs(obj):
+    """ All dicts nested in a campaign object """
+    if isinstance(obj, dict):
+        yield obj
+        for v in obj.values():
+            for config in walk_configs(v):
+                yield config
+    elif isinstance(obj, list):
+        for v in obj:
+            for config in walk_configs(v):
+                yield config
+
+
+class CampaignProfiler(object):
+    """
+    Campaign size and complexity profiler, wrapping a config builder like StreamingCampaignWriter.
+    Each event added is attributed to the outermost profiled builder on the call stack (add_drug_campaign,
+    add_health_seeking, ...) and to the line calling it, recording per call site the number of events, serialized
+    bytes, maximum nesting depth, listened triggers and intervention classes (so that e.g. AdherentDrug configs from
+    configure_adherent_drug show up under the builder that distributes them).
+    With a budget, a warning is logged the first time the campaign total exceeds each threshold.
+
+    profiler = CampaignProfiler(cb, budget={'events': 10000, 'bytes': 50e6})
+    add_drug_campaign(profiler, 'MDA', 'DP', start_days=range(0, 3650, 30))
+    print(profiler.report())
+    """
+
+    budget_metrics = ('events', 'bytes', 'depth', 'triggers')
+
+    def __init__(self, cb, budget=None, builders=None):
+        """
+        :param cb: the config builder to wrap; events are passed on to it
+        :param budget: dict of thresholds for the campaign totals of events, bytes, depth and (distinct) triggers
+        :param builders: list of (module, function name) of the builders to attribute events to,
+                         default is profiled_builders (skipping those whose module is not installed)
+        """
+        self.cb = cb
+        self.budget = budget or {}
+        unknown = set(self.budget) - set(self.budget_metrics)
+        if unknown:
+            raise ValueError('Unknown budget metrics %s, use %s' % (sorted(unknown), list(self.budget_metrics)))
+
+        self.builder_codes = {}
+        for module, name in builders or profiled_builders:
+            try:
+                fn = getattr(importlib.import_module(module), name)
+            except ImportError:
+                if builders:
+                    raise
+                logger.debug('Not profiling %s.%s, which is not installed', module, name)
+                continue
+            self.builder_codes[fn.__code__] = name
+
+        self.sites = OrderedDict()  # (builder, call site) -> metrics
+        self.totals = {'events': 0, 'bytes': 0, 'depth': 0, 'triggers': set()}
+        self.exceeded = set()
+
+    def call_site(self):
+        """ (outermost profiled builder, 'file:line' calling it) of the current add_event call """
+        builder, site = None, None
+        frame = sys._getframe(2)
+        while frame is not None:
+            if frame.f_code in self.builder_codes and frame.f_back is not None:
+                builder = self.builder_codes[frame.f_code]
+                site = '%s:%d' % (os.path.basename(frame.f_back.f_code.co_filename), frame.f_back.f_lineno)
+            frame = frame.f_back
+        return builder or 'unprofiled', site or ''
+
+    def add_event(self, event):
+        raw = event if isinstance(event, dict) else event.to_json()
+        n_bytes = len(json.dumps(raw))
+        depth = nesting_depth(raw)
+        configs = list(walk_configs(raw))
+        triggers = set(t for c in configs for t in c.get('Trigger_Condition_List', []) if isinstance(t, str))
+
+        key = self.call_site()
+        if key not in self.sites:
+            self.sites[key] = {'events': 0, 'bytes': 0, 'depth': 0, 'triggers': set(), 'classes': Counter()}
+        site = self.sites[key]
+        site['events'] += 1
+        site['bytes'] += n_bytes
+        site['depth'] = max(site['depth'], depth)
+        site['triggers'] |= triggers
+        site['classes'].update(c['class'] for c in configs if 'class' in c and not is_structural_class(c['class']))
+
+        self.totals['events'] += 1
+        self.totals['bytes'] += n_bytes
+        self.totals['depth'] = max(self.totals['depth'], depth)
+        self.totals['triggers'] |= triggers
+        self.check_budget()
+
+        self.cb.add_event(event)
+
+    def check_budget(self):
+        for metric, limit in self.budget.items():
+            value = self.totals[metric]
+            value = len(value) if isinstance(value, set) else value
+            if value > limit and metric not in self.exceeded:
+                self.exceeded.add(metric)
+                worst = max(self.sites.items(), key=lambda item: item[1]['bytes'])[0]
+                logger.warning('Campaign exceeds its %s budget (%s > %s); largest contributor: %s at %s',
+                               metric, value, limit, worst[0], worst[1])
+
+    def report(self):
+        """
+        :return: pandas.DataFrame with a row per (builder, call site), ranked by serialized bytes
+        """
+        rows = [{'builder': builder, 'call_site': site, 'events': m['events'], 'bytes': m['bytes'],
+                 'max_depth': m['depth'], 'triggers': len(m['triggers']),
+                 'top_classes': ', '.join('%s x%d' % c for c in m['classes'].most_common(3))}
+                for (builder, site), m in self.sites.items()]
+        columns = ['builder', 'call_site', 'events', 'bytes', 'max_depth', 'triggers', 'top_classes']
+        report = pd.DataFrame(rows, columns=columns).sort_values('bytes', ascending=False, kind='mergesort')
+        report['bytes_fraction'] = report['bytes'] / float(max(self.totals['bytes'], 1))
+        return report.reset_index(drop=True)
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the profiler itself, e.g. not yet set while copying or unpickling
+        cb = self.__dict__.get('cb')
+        if cb is None:
+            raise AttributeError(name)
+        return getattr(cb, name)
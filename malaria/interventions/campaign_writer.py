@@ -0,0 +1,80 @@
+import gzip
+import json
+import os
+
+
+class StreamingCampaignWriter(object):
+    """
+    Campaign sink writing each event to disk as it is added, instead of keeping every event dict in memory
+    until the campaign is dumped.
+    It wraps a config builder and can be passed to any campaign builder in place of it: add_event writes the event
+    to the campaign file, everything else (config, set_param, ...) goes to the wrapped config builder.
+
+    with StreamingCampaignWriter(cb, 'campaign.json.gz') as stream:
+        add_drug_campaign(stream, 'MDA', 'DP', start_days=[0, 365])
+    """
+
+    def __init__(self, cb, filename, compress=None, campaign_name='Streamed campaign', use_defaults=1):
+        """
+        :param cb: the config builder to wrap
+        :param filename: path of the campaign JSON file to write
+        :param compress: gzip the file (default: if filename ends with .gz)
+        :param campaign_name: Campaign_Name of the campaign file
+        :param use_defaults: Use_Defaults of the campaign file
+        """
+        self.cb = cb
+        self.filename = filename
+        self.n_events = 0
+
+        if compress is None:
+            compress = filename.endswith('.gz')
+        self.fp = gzip.open(filename, 'wb') if compress else open(filename, 'wb')
+
+        header = json.dumps({'Campaign_Name': campaign_name, 'Use_Defaults': use_defaults})
+        self._write(header[:-1] + ', "Events": [')
+
+    def _write(self, text):
+        self.fp.write(text.encode('utf-8'))
+
+    def add_event(self, event):
+        """
+        Serialize a campaign event (RawCampaignObject or dict) to the campaign file
+        """
+        if not isinstance(event, dict):
+            event = event.to_json()
+        self._write((',\n' if self.n_events else '\n') + json.dumps(event))
+        self.n_events += 1
+
+    def close(self):
+        """
+        Close the Events array and the campaign file
+        """
+        if not self.fp.closed:
+            self._write('\n]}\n')
+            self.fp.close()
+
+    def discard(self):
+        """
+        Close and remove the campaign file, e.g. when building the campaign failed part way
+        """
+        if not self.fp.closed:
+            self.fp.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # A campaign interrupted by an exception is incomplete: leave no valid-looking file behind
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the writer itself, e.g. not yet set while copying or unpickling
+        cb = self.__dict__.get('cb')
+        if cb is None:
+            raise AttributeError(name)
+        return getattr(cb, name)
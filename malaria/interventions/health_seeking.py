@@ -57,10 +57,11 @@ def add_health_seeking(config_builder,
     if broadcast_event_name not in config_builder.config["parameters"]['Listed_Events']:
         config_builder.config["parameters"]['Listed_Events'].append(broadcast_event_name)
 
-    expire_recent_drugs['Revert'] = drug_ineligibility_duration
+    # per-call copy: the module-level template is shared by every builder
+    expire_drugs = dict(expire_recent_drugs, Revert=drug_ineligibility_duration)
 
     drug_config, drugs = get_drug_config(drug, dosing, receiving_drugs_event,
-                                         drug_ineligibility_duration, expire_recent_drugs)
+                                         drug_ineligibility_duration, expire_drugs)
 
     for t in targets:
 
@@ -86,7 +87,7 @@ def add_health_seeking(config_builder,
         if drug_ineligibility_duration > 0 :
             drugstatus = {"DrugStatus": "None"}
             if ind_property_restrictions :
-                health_seeking_config['Intervention_Config']["Property_Restrictions_Within_Node"] = [dict(drugstatus.items() + x.items()) for x in ind_property_restrictions]
+                health_seeking_config['Intervention_Config']["Property_Restrictions_Within_Node"] = [dict(drugstatus, **x) for x in ind_property_restrictions]
             else :
                 health_seeking_config['Intervention_Config']["Property_Restrictions_Within_Node"] = [drugstatus]
 
@@ -159,9 +160,9 @@ def add_health_seeking_by_chw( config_builder,
     if drug_ineligibility_duration > 0:
         chw_config["Property_Restrictions_Within_Node"].append({"DrugStatus": "None"})
 
-    expire_recent_drugs['Revert'] = drug_ineligibility_duration
+    expire_drugs = dict(expire_recent_drugs, Revert=drug_ineligibility_duration)
     drug_config, drugs = get_drug_config(drug, dosing, receiving_drugs_event,
-                                         drug_ineligibility_duration, expire_recent_drugs)
+                                         drug_ineligibility_duration, expire_drugs)
     actual_config = build_actual_treatment_cfg(0, drug_config, drugs)
 
     chw_config['Intervention_Config'] = actual_config
@@ -1,8 +1,8 @@
 from malaria.interventions.malaria_drugs import drug_configs_from_code
 from malaria.interventions.malaria_diagnostic import add_diagnostic_survey
+from malaria.interventions.campaign_compaction import compact_events, distribution_days, start_day_runs
 from dtk.interventions.triggered_campaign_delay_event import triggered_campaign_delay_event
 from dtk.utils.Campaign.utils.RawCampaignObject import RawCampaignObject
-from copy import deepcopy, copy
 import random
 
 
@@ -12,7 +12,8 @@ def add_drug_campaign(cb, campaign_type, drug_code='', start_days=[0], coverage=
                       trigger_coverage=1.0, snowballs=0, treatment_delay=0, triggered_campaign_delay=0, nodes=[],
                       target_group='Everyone', dosing='', drug_ineligibility_duration=0,
                       node_property_restrictions=[], ind_property_restrictions=[], trigger_condition_list=[],
-                      listening_duration=-1, adherent_drug_configs=[], target_residents_only=1):
+                      listening_duration=-1, adherent_drug_configs=[], target_residents_only=1,
+                      compact_campaign=False):
     """
     Add a drug campaign defined by the parameters to the config builder.
     Note: When using "trigger_condition_list", the first entry of "start_days" is the day that is used to start
@@ -59,6 +60,9 @@ def add_drug_campaign(cb, campaign_type, drug_code='', start_days=[0], coverage=
     :param listening_duration: is the duration for which the listen for the trigger, -1 indicates "indefinitely/forever"
     Format: list of dicts: [{ "NodeProperty1" : "PropertyValue1" }, {'NodeProperty2': "PropertyValue2"}, ...]
     :param adherent_drug_configs: a list of adherent drug configurations, which are dictionaries (from configure_adherent_drug)
+    :param compact_campaign: for non-triggered MDA and MSAT, merge the events of the start days into as few events as
+    possible, using Number_Repetitions for each arithmetic series of distribution days. Who receives what on which day
+    is unchanged, but merged repetitions are distributed before other campaigns that start on the same day.
     """
 
     expire_recent_drugs = {}
@@ -102,14 +106,15 @@ def add_drug_campaign(cb, campaign_type, drug_code='', start_days=[0], coverage=
     if campaign_type == 'MDA' or campaign_type == 'SMC':
         add_MDA(cb, start_days, coverage, drug_configs, receiving_drugs_event, repetitions, interval, node_cfg,
                 expire_recent_drugs, node_property_restrictions, ind_property_restrictions, target_group,
-                trigger_condition_list, listening_duration, triggered_campaign_delay, target_residents_only)
+                trigger_condition_list, listening_duration, triggered_campaign_delay, target_residents_only,
+                compact_campaign)
 
     elif campaign_type == 'MSAT' or campaign_type == 'MTAT':
         add_MSAT(cb, start_days, coverage, drug_configs, receiving_drugs_event, repetitions, interval,
                  treatment_delay, diagnostic_type, diagnostic_threshold, node_cfg, expire_recent_drugs,
                  node_property_restrictions, ind_property_restrictions, target_group,
                  trigger_condition_list, triggered_campaign_delay,
-                 listening_duration)
+                 listening_duration, compact_campaign)
 
     elif campaign_type == 'fMDA':
         add_fMDA(cb, start_days, trigger_coverage, coverage, drug_configs, receiving_drugs_event, repetitions, interval,
@@ -144,7 +149,8 @@ def add_drug_campaign(cb, campaign_type, drug_code='', start_days=[0], coverage=
 
 def add_MDA(cb, start_days, coverage, drug_configs, receiving_drugs_event, repetitions, interval,
             nodes, expire_recent_drugs, node_property_restrictions, ind_property_restrictions, target_group,
-            trigger_condition_list=[], listening_duration=-1, triggered_campaign_delay=0, target_residents_only=1):
+            trigger_condition_list=[], listening_duration=-1, triggered_campaign_delay=0, target_residents_only=1,
+            compact_campaign=False):
 
     interventions = drug_configs + [receiving_drugs_event]
 
@@ -152,8 +158,7 @@ def add_MDA(cb, start_days, coverage, drug_configs, receiving_drugs_event, repet
         interventions = interventions + [expire_recent_drugs]
         drugstatus = {"DrugStatus": "None"}
         if ind_property_restrictions:
-            for item in ind_property_restrictions:
-                item.update(drugstatus)
+            ind_property_restrictions = [dict(item, **drugstatus) for item in ind_property_restrictions]
         else:
             ind_property_restrictions = [drugstatus]
 
@@ -197,6 +202,7 @@ def add_MDA(cb, start_days, coverage, drug_configs, receiving_drugs_event, repet
         cb.add_event(RawCampaignObject(drug_event))
 
     else:
+        drug_events = []
         for start_day in start_days:
             drug_event = {
                 "class": "CampaignEvent",
@@ -224,6 +230,11 @@ def add_MDA(cb, start_days, coverage, drug_configs, receiving_drugs_event, repet
                     "Target_Age_Max": target_group['agemax']
                 })
 
+            drug_events.append(drug_event)
+
+        if compact_campaign:
+            drug_events = compact_events(drug_events)
+        for drug_event in drug_events:
             cb.add_event(RawCampaignObject(drug_event))
 
 
@@ -231,7 +242,7 @@ def add_MSAT(cb, start_days, coverage, drug_configs, receiving_drugs_event, repe
              treatment_delay, diagnostic_type, diagnostic_threshold,
              nodes, expire_recent_drugs, node_property_restrictions,
              ind_property_restrictions, target_group, trigger_condition_list,
-             triggered_campaign_delay, listening_duration):
+             triggered_campaign_delay, listening_duration, compact_campaign=False):
 
     event_config = drug_configs + [receiving_drugs_event]
     IP_restrictions = []
@@ -258,8 +269,12 @@ def add_MSAT(cb, start_days, coverage, drug_configs, receiving_drugs_event, repe
                               pos_diag_IP_restrictions=IP_restrictions, trigger_condition_list=trigger_condition_list,
                               listening_duration=listening_duration, triggered_campaign_delay=triggered_campaign_delay)
     else:
-        for start_day in start_days:
-            add_diagnostic_survey(cb, coverage=coverage, repetitions=repetitions, tsteps_btwn=interval,
+        surveys = [(start_day, repetitions, interval) for start_day in start_days]
+        if compact_campaign and repetitions >= 0:  # surveys repeating indefinitely are left as they are
+            surveys = [(start_day, count, step or interval) for start_day, count, step in
+                       start_day_runs(distribution_days(start_days, repetitions, interval))]
+        for start_day, survey_repetitions, survey_interval in surveys:
+            add_diagnostic_survey(cb, coverage=coverage, repetitions=survey_repetitions, tsteps_btwn=survey_interval,
                                   target=target_group, start_day=start_day,
                                   diagnostic_type=diagnostic_type, diagnostic_threshold=diagnostic_threshold,
                                   node_cfg=nodes, positive_diagnosis_configs=msat_cfg,
@@ -282,8 +297,7 @@ def add_fMDA(cb, start_days, trigger_coverage, coverage, drug_configs, receiving
         interventions = interventions + [expire_recent_drugs]
         drugstatus = {"DrugStatus": "None"}
         if ind_property_restrictions:
-            for item in ind_property_restrictions:
-                item.update(drugstatus)
+            ind_property_restrictions = [dict(item, **drugstatus) for item in ind_property_restrictions]
         else:
             ind_property_restrictions = [drugstatus]
 
@@ -374,10 +388,9 @@ def add_rfMSAT(cb, start_day, coverage, drug_configs, receiving_drugs_event, int
                expire_recent_drugs, node_property_restrictions, ind_property_restrictions, trigger_condition_list,
                listening_duration, triggered_campaign_delay):
 
-    fmda_setup = fmda_cfg(fmda_radius, node_selection_type) # no trigger used
-    snowball_setup = [deepcopy(fmda_setup) for x in range(snowballs + 1)]
     snowball_trigger = 'Diagnostic_Survey_'
-    snowball_setup[0]['Event_Trigger'] = snowball_trigger + "0"
+    snowball_setup = [fmda_cfg(fmda_radius, node_selection_type, event_trigger=snowball_trigger + str(x))
+                      for x in range(snowballs + 1)]
 
     rcd_event = {"Event_Name": "Trigger RCD MSAT",
                  "class": "CampaignEvent",
@@ -423,7 +436,6 @@ def add_rfMSAT(cb, start_day, coverage, drug_configs, receiving_drugs_event, int
                           pos_diag_IP_restrictions=IP_restrictions)
 
     for snowball in range(snowballs):
-        snowball_setup[snowball+1]['Event_Trigger'] = snowball_trigger + str(snowball+1)
         event_config = [snowball_setup[snowball+1], receiving_drugs_event] + drug_configs
         curr_trigger = snowball_trigger + str(snowball)
         add_diagnostic_survey(cb, coverage=coverage, start_day=start_day,
@@ -472,8 +484,7 @@ def add_rfMDA(cb, start_day, coverage, drug_configs, receiving_drugs_event, inte
         interventions = interventions + [expire_recent_drugs]
         drugstatus = {"DrugStatus": "None"}
         if ind_property_restrictions:
-            for item in ind_property_restrictions:
-                item.update(drugstatus)
+            ind_property_restrictions = [dict(item, **drugstatus) for item in ind_property_restrictions]
         else:
             ind_property_restrictions = [drugstatus]
 
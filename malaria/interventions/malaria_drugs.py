@@ -18,6 +18,59 @@ def add_drug_campaign(cb, drug_code, start_days, coverage=1.0, repetitions=3, in
     new_campaign(cb, campaign_type, drugs, start_days=start_days,
                  coverage=coverage, repetitions=repetitions, interval=interval)
 
+# Compiled drug codes: drug code -> AntimalarialDrug intervention configs, built once and copied on use
+_drug_code_configs = {}
+
+
+class _CustomizedDrugParams(dict):
+    """
+    Parameters of a drug owned by one config builder, copied from the shared ``drug_params``
+    by install_drug_params or set_drug_param
+    """
+    pass
+
+
+def compile_drug_code(drug_code):
+    """
+    The AntimalarialDrug intervention configs of a drug code, built once per process.
+    The returned configs are shared and must not be modified; drug_configs_from_code returns copies.
+
+    :param drug_code: Code of the drug regimen, one of the ``drug_cfg`` keys
+    :return: list of AntimalarialDrug intervention configs
+    """
+    configs = _drug_code_configs.get(drug_code)
+    if configs is None:
+        configs = [{"class": "AntimalarialDrug",
+                    "Drug_Type": drug,
+                    "Dosing_Type": "FullTreatmentCourse",
+                    "Cost_To_Consumer": 1.5} for drug in drug_cfg[drug_code]]
+        _drug_code_configs[drug_code] = configs
+    return configs
+
+
+def _copy_params(value):
+    # copy of nested parameter dicts and lists
+    if isinstance(value, dict):
+        return dict((k, _copy_params(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [_copy_params(v) for v in value]
+    return value
+
+
+def install_drug_params(cb, drugs):
+    """
+    Write a copy of the parameters of drugs to the Malaria_Drug_Params of the config builder,
+    keeping those already installed or changed with set_drug_param.
+
+    :param cb: The :py:class:`DTKConfigBuilder <dtk.utils.core.DTKConfigBuilder>` that will receive the drug parameters
+    :param drugs: list of drug names
+    """
+    drug_config = cb.config["parameters"]["Malaria_Drug_Params"]
+    for drug in drugs:
+        if not isinstance(drug_config.get(drug), _CustomizedDrugParams):
+            drug_config[drug] = _CustomizedDrugParams(_copy_params(drug_params[drug]))
+
+
 def drug_configs_from_code(cb,drug_code):
     """
     Add a drug config to the simulation configuration based on its code and add the corresponding AntimalarialDrug intervention to the return dictionary.
@@ -30,22 +83,11 @@ def drug_configs_from_code(cb,drug_code):
     :param drug_code: Code of the drug to add
     :return: A dictionary containing the parameters for an intervention using the given drug
     """
-    dosing_type = "FullTreatmentCourse"
-    drug_array = drug_cfg[drug_code]
-
-    cb.set_param("PKPD_Model", "CONCENTRATION_VERSUS_TIME")
-
-    drug_configs = []
-    for drug in drug_array:
-        cb.config["parameters"]["Malaria_Drug_Params"][drug] = drug_params[drug]
-        drug_intervention = {
-            "class": "AntimalarialDrug",
-            "Drug_Type": drug,
-            "Dosing_Type": dosing_type,
-            "Cost_To_Consumer": 1.5
-        }
-        drug_configs.append(drug_intervention)
-    return drug_configs
+    if cb.config["parameters"].get("PKPD_Model") != "CONCENTRATION_VERSUS_TIME":
+        cb.set_param("PKPD_Model", "CONCENTRATION_VERSUS_TIME")
+    install_drug_params(cb, drug_cfg[drug_code])
+
+    return [dict(config) for config in compile_drug_code(drug_code)]
 
 def set_drug_param(cb, drugname, parameter, value):
     """
@@ -57,7 +99,10 @@ def set_drug_param(cb, drugname, parameter, value):
     :param value: The new value to set
     :return:
     """
-    cb.config['parameters']['Malaria_Drug_Params'][drugname][parameter] = value
+    drug_config = cb.config['parameters']['Malaria_Drug_Params']
+    if not isinstance(drug_config[drugname], _CustomizedDrugParams):  # copy on write
+        drug_config[drugname] = _CustomizedDrugParams(_copy_params(drug_config[drugname]))
+    drug_config[drugname][parameter] = value
     return {'.'.join([drugname, parameter]): value}
 
 def get_drug_param(cb, drugname, parameter):
@@ -75,6 +120,109 @@ def get_drug_param(cb, drugname, parameter):
         print('Unable to get parameter %s for drug %s' % (parameter, drugname))
         return None
 
+
+def _known_drug_params(drug_config):
+    # drug -> its parameter names, as configured in Malaria_Drug_Params or else as defined in drug_params
+    known = dict((drug, list(params)) for drug, params in drug_params.items())
+    known.update((drug, list(params)) for drug, params in drug_config.items())
+    return known
+
+
+def _validate_drug_params(values, known_params):
+    # values: dict of drug -> dict (or list) of parameters; known_params: dict of drug -> its parameter names
+    unknown_drugs = sorted(set(values) - set(known_params))
+    if unknown_drugs:
+        raise ValueError('Unknown drugs %s' % unknown_drugs)
+    for drug in sorted(values):
+        unknown_params = sorted(set(values[drug]) - set(known_params[drug]))
+        if unknown_params:
+            raise ValueError('Unknown parameters %s of drug %s, use %s'
+                             % (unknown_params, drug, sorted(known_params[drug])))
+
+
+def _is_missing(value):
+    return isinstance(value, float) and value != value
+
+
+def get_drug_params(cb=None, drugs=None, parameters=None):
+    """
+    Table of drug parameters, from the Malaria_Drug_Params of a config builder or from ``drug_params``.
+
+    :param cb: The :py:class:`DTKConfigBuilder <dtk.utils.core.DTKConfigBuilder>` holding the configuration (default: the ``drug_params`` definitions)
+    :param drugs: list of drugs to include (default: all drugs)
+    :param parameters: list of parameters to include (default: all parameters)
+    :return: pandas.DataFrame with a row per drug and a column per parameter, NaN where a drug lacks a parameter
+    """
+    import pandas as pd
+
+    source = drug_params if cb is None else cb.config['parameters']['Malaria_Drug_Params']
+    drugs = sorted(source) if drugs is None else list(drugs)
+    parameters = drug_param_names if parameters is None else list(parameters)
+    # A drug lacking a parameter of another drug gets NaN, so parameters are checked against all drugs
+    all_params = set(p for params in source.values() for p in params) | set(drug_param_names)
+    _validate_drug_params(dict((drug, parameters) for drug in drugs), dict((drug, all_params) for drug in source))
+
+    rows = [[source[drug].get(p, float('nan')) for p in parameters] for drug in drugs]
+    return pd.DataFrame(rows, index=pd.Index(drugs, name='drug'), columns=parameters, dtype=object)
+
+
+def set_drug_params(cb, values):
+    """
+    Set many drug parameters in the config builder passed at once.
+    All drugs and parameters are validated before anything is set; drugs not yet in the configuration are added first.
+
+    :param cb: The :py:class:`DTKConfigBuilder <dtk.utils.core.DTKConfigBuilder>` containing the simulation configuration
+    :param values: pandas.DataFrame with a row per drug and a column per parameter (NaN cells are left unchanged),
+                   or dict of drug -> dict of parameter -> value
+    :return: dict of tags ('drug.parameter': value) as set_drug_param
+    """
+    if hasattr(values, 'to_dict'):
+        values = values.to_dict('index')
+    values = dict((drug, dict((p, v) for p, v in params.items() if not _is_missing(v)))
+                  for drug, params in values.items())
+
+    drug_config = cb.config['parameters']['Malaria_Drug_Params']
+    _validate_drug_params(values, _known_drug_params(drug_config))
+    install_drug_params(cb, [drug for drug in values if drug not in drug_config])
+
+    tags = {}
+    for drug, params in values.items():
+        if not params:
+            continue
+        if not isinstance(drug_config[drug], _CustomizedDrugParams):  # copy on write
+            drug_config[drug] = _CustomizedDrugParams(_copy_params(drug_config[drug]))
+        drug_config[drug].update(params)
+        tags.update(('.'.join([drug, p]), v) for p, v in params.items())
+    return tags
+
+
+def apply_drug_param_sweep(cbs, sweep):
+    """
+    Apply a sweep matrix of drug parameters to many config builders, one row per config builder.
+
+    :param cbs: list of :py:class:`DTKConfigBuilder <dtk.utils.core.DTKConfigBuilder>`
+    :param sweep: pandas.DataFrame with a row per config builder and a column per (drug, parameter), either as a
+                  two-level column index or as 'drug.parameter' names; NaN cells are left unchanged
+    :return: list of the tags of each config builder
+    """
+    if len(cbs) != len(sweep):
+        raise ValueError('The sweep has %d rows for %d config builders' % (len(sweep), len(cbs)))
+
+    columns = [c if isinstance(c, tuple) else tuple(c.split('.', 1)) for c in sweep.columns]
+    if any(len(c) != 2 for c in columns):
+        raise ValueError('Sweep columns must be (drug, parameter) pairs or "drug.parameter" names')
+    swept = dict((drug, [p for d, p in columns if d == drug]) for drug, _ in columns)
+    for cb in cbs:
+        _validate_drug_params(swept, _known_drug_params(cb.config['parameters']['Malaria_Drug_Params']))
+
+    tags = []
+    for cb, row in zip(cbs, sweep.itertuples(index=False, name=None)):
+        values = {}
+        for (drug, parameter), value in zip(columns, row):
+            values.setdefault(drug, {})[parameter] = value
+        tags.append(set_drug_params(cb, values))
+    return tags
+
 # Definitions of drug blocks
 drug_params = {
 
@@ -412,4 +560,7 @@ drug_cfg = {
     "SPP" : ["Sulfadoxine", "Pyrimethamine", 'Primaquine'],
     "SPA" : ["Sulfadoxine", "Pyrimethamine", 'Amodiaquine'],
     "Vehicle" : ["Vehicle"]
-}
\ No newline at end of file
+}
+
+# Names of the parameters of a drug in Malaria_Drug_Params
+drug_param_names = sorted(set(p for params in drug_params.values() for p in params))
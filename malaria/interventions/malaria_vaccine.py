@@ -20,8 +20,8 @@ def add_vaccine(cb, vaccine_type='RTSS', vaccine_params={}, start_days=[0], cove
     if vaccine_type not in ['RTSS', 'PEV', 'TBV'] :
         raise ValueError('Requested vaccine type %s has not been specified' % vaccine_type)
 
-    vaccine_dict = load_vaccines()
-    vaccine = copy.deepcopy(vaccine_dict[vaccine_type])
+    # shallow copy of the shared template: nested configs are shared by reference and never modified
+    vaccine = dict(vaccine_templates[vaccine_type])
 
     if vaccine_params :
         vaccine.update(vaccine_params)
@@ -150,4 +150,8 @@ def load_vaccines() :
                     'PEV': preerythrocytic_vaccine,
                     'TBV': sexual_stage_vaccine}
 
-    return vaccine_dict
\ No newline at end of file
+    return vaccine_dict
+
+
+# built once and shared by every add_vaccine call; use load_vaccines() for a modifiable copy
+vaccine_templates = load_vaccines()
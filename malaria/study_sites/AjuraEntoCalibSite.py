@@ -3,6 +3,7 @@ import os
 import numpy as np
 import calendar
 from calibtool.analyzers.Helpers import garki_multi_year_ento_data
+from malaria.analyzers.Helpers import cached_reference_data
 
 from calibtool.study_sites.EntomologyCalibSite import EntomologyCalibSite
 from calibtool.analyzers.ChannelByMultiYearSeasonCohortAnalyzer import ChannelByMultiYearSeasonCohortAnalyzer
@@ -32,7 +33,7 @@ class AjuraEntoCalibSite(EntomologyCalibSite):
         # Load the Parasitology CSV
         dir_path = os.path.dirname(os.path.realpath(__file__))
         reference_csv = os.path.join(dir_path, 'inputs', 'GarkiDB_data', 'GarkiDBentomology_MBR_multiyear.csv')
-        reference_data = garki_multi_year_ento_data(reference_csv, self.metadata, time_limit=60)
+        reference_data = cached_reference_data(garki_multi_year_ento_data, reference_csv, self.metadata, time_limit=60)
         # self.duration = int(max(refernce_data.reset_index()['Month']) / 12) + 1
 
         return reference_data
@@ -3,6 +3,7 @@ import os
 import numpy as np
 import calendar
 from calibtool.analyzers.Helpers import garki_ento_data
+from malaria.analyzers.Helpers import cached_reference_data
 
 from calibtool.study_sites.EntomologyCalibSite import EntomologyCalibSite
 from calibtool.analyzers.ChannelBySeasonCohortAnalyzer import ChannelBySeasonCohortAnalyzer
@@ -28,7 +29,7 @@ class GarkiEntoCalibSite(EntomologyCalibSite):
         # Load the Parasitology CSV
         dir_path = os.path.dirname(os.path.realpath(__file__))
         reference_csv = os.path.join(dir_path, 'inputs', 'GarkiDB_data', 'GarkiDBentomology_MBR.csv')
-        reference_data = garki_ento_data(reference_csv, self.metadata)
+        reference_data = cached_reference_data(garki_ento_data, reference_csv, self.metadata)
 
         return reference_data
 
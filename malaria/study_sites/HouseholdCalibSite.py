@@ -1,4 +1,5 @@
 import logging
+import os
 from collections import OrderedDict
 from abc import ABCMeta
 
@@ -6,9 +7,10 @@ import numpy as np
 import pandas as pd
 from calibtool.CalibSite import CalibSite
 from calibtool.study_sites.site_setup_functions import *
+from malaria.analyzers.Helpers import get_neighbor_index
 
-from calibtool.analyzers.PrevalenceByRoundAnalyzer import PrevalenceByRoundAnalyzer
-from calibtool.analyzers.PositiveFractionByDistanceAnalyzer import PositiveFractionByDistanceAnalyzer
+from malaria.analyzers.PrevalenceByRoundAnalyzer import PrevalenceByRoundAnalyzer
+from malaria.analyzers.PositiveFractionByDistanceAnalyzer import PositiveFractionByDistanceAnalyzer
 
 logger = logging.getLogger(__name__)
 
@@ -159,10 +161,11 @@ class HouseholdCalibSite(CalibSite):
         return self.metadata['ignore_nodes']
 
     def get_distance_matrix(self):
-        try :
-            return pd.read_csv(self.metadata['distance_matrix_fname'])
-        except IOError :
+        # Shared, memory-mapped neighbor index rather than a per-analyzer copy of the full pairwise csv
+        distance_matrix_fname = self.metadata['distance_matrix_fname']
+        if not os.path.exists(distance_matrix_fname):
             return None
+        return get_neighbor_index(distance_matrix_fname)
 
     def get_analyzers(self):
         return [PrevalenceByRoundAnalyzer(site=self),
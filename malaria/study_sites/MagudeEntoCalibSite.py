@@ -2,7 +2,7 @@ import logging
 import os
 import numpy as np
 import calendar
-from calibtool.analyzers.Helpers import ento_data
+from malaria.analyzers.Helpers import cached_reference_data, ento_data
 
 from calibtool.study_sites.EntomologyCalibSite import EntomologyCalibSite
 from calibtool.analyzers.ChannelBySeasonCohortAnalyzer import ChannelBySeasonCohortAnalyzer
@@ -23,7 +23,7 @@ class MagudeEntoCalibSite(EntomologyCalibSite):
         # Load the Parasitology CSV
         dir_path = os.path.dirname(os.path.realpath(__file__))
         reference_csv = os.path.join(dir_path, 'inputs', 'Mozambique_ento_data', 'mosquito_count_by_house_day.csv')
-        reference_data = ento_data(reference_csv, self.metadata)
+        reference_data = cached_reference_data(ento_data, reference_csv, self.metadata)
 
         return reference_data
 
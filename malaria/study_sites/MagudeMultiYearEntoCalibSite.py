@@ -3,6 +3,7 @@ import os
 import numpy as np
 import calendar
 from calibtool.analyzers.Helpers import multi_year_ento_data, multi_year_ento_data_clustered
+from malaria.analyzers.Helpers import cached_reference_data
 
 from calibtool.study_sites.EntomologyCalibSite import EntomologyCalibSite
 from calibtool.analyzers.ChannelByMultiYearSeasonCohortAnalyzer import ChannelByMultiYearSeasonCohortAnalyzer
@@ -32,10 +33,10 @@ class MagudeMultiYearEntoCalibSite(EntomologyCalibSite):
         dir_path = os.path.dirname(os.path.realpath(__file__))
         if not self.metadata['HFCA']:
             reference_csv = os.path.join(dir_path, 'inputs', 'Mozambique_ento_data', 'mosquito_count_by_house_day.csv')
-            reference_data = multi_year_ento_data(reference_csv, self.metadata)
+            reference_data = cached_reference_data(multi_year_ento_data, reference_csv, self.metadata)
         else:
             reference_csv = os.path.join(dir_path, 'inputs', 'Mozambique_ento_data', 'cluster_mosquito_counts_per_house_by_month.csv')
-            reference_data = multi_year_ento_data_clustered(reference_csv, self.metadata)
+            reference_data = cached_reference_data(multi_year_ento_data_clustered, reference_csv, self.metadata)
 
         return reference_data
 
@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 import itertools
 from calibtool.analyzers.Helpers import grouped_df_date
+from malaria.analyzers.Helpers import get_garki_store, garki_store_to_pandas
 from collections import OrderedDict
 
 from calibtool.study_sites.DensityCalibSite import DensityCalibSite
@@ -34,8 +35,7 @@ class MatsariAgeDateSite(DensityCalibSite):
         dir_path = os.path.dirname(os.path.realpath(__file__))
         reference_csv = os.path.join(dir_path, 'inputs', 'GarkiDB_data', 'GarkiDBparasitology_dates.csv')
 
-        df = pd.read_csv(reference_csv)
-        df = df.loc[df['Village'] == self.metadata['village']]
+        df = garki_store_to_pandas(get_garki_store(reference_csv), self.metadata['village'])
 
         pfprBinsDensity = self.metadata['parasitemia_bins']
         uL_per_field = 0.5 / 200.0  # from Garki PDF - page 111 - 0.5 uL per 200 views
@@ -2,7 +2,7 @@ import logging
 import os
 import numpy as np
 import calendar
-from calibtool.analyzers.Helpers import ento_spatial_data
+from malaria.analyzers.Helpers import cached_reference_data, ento_spatial_data
 
 from calibtool.study_sites.EntomologySpatialCalibSite import EntomologySpatialCalibSite
 import glob
@@ -89,7 +89,8 @@ class MoineSpatialCalibSite(EntomologySpatialCalibSite):
         reference_csv = os.path.join(dir_path, 'inputs', 'Mozambique_ento_data', 'mosquito_count_by_house_day.csv')
         hhs_hfs_csv = os.path.join(dir_path, 'inputs', 'Mozambique_ento_data', 'hh_by_health_facility.csv')
         hhs_csv = os.path.join(dir_path, 'inputs', 'Mozambique_ento_data', 'census_mda_households.csv')
-        reference_data = ento_spatial_data(reference_csv, hhs_hfs_csv, hhs_csv, self.metadata)
+        reference_data = cached_reference_data(ento_spatial_data, [reference_csv, hhs_hfs_csv, hhs_csv],
+                                               self.metadata)
 
         return reference_data
 
@@ -1,7 +1,7 @@
 import logging
 import os
 import numpy as np
-from calibtool.analyzers.Helpers import season_channel_age_density_csv_to_pandas
+from malaria.analyzers.Helpers import cached_reference_data, season_channel_age_density_csv_to_pandas
 from calibtool.study_sites.site_setup_functions import \
     config_setup_fn, summary_report_fn, add_treatment_fn, site_input_eir_fn
 
@@ -36,7 +36,7 @@ class RafinMarkeAgeSeasonCalibSite(DensityCalibSite):
         # Load the Parasitology CSV
         dir_path = os.path.dirname(os.path.realpath(__file__))
         reference_csv = os.path.join(dir_path, 'inputs', 'GarkiDB_data', 'GarkiDBparasitology.csv')
-        reference_data = season_channel_age_density_csv_to_pandas(reference_csv, self.metadata)
+        reference_data = cached_reference_data(season_channel_age_density_csv_to_pandas, reference_csv, self.metadata)
 
         return reference_data
 
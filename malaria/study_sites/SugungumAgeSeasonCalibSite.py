@@ -1,7 +1,7 @@
 import logging
 import os
 import numpy as np
-from calibtool.analyzers.Helpers import season_channel_age_density_csv_to_pandas
+from malaria.analyzers.Helpers import cached_reference_data, season_channel_age_density_csv_to_pandas
 
 from calibtool.study_sites.DensityCalibSite import DensityCalibSite
 
@@ -27,7 +27,7 @@ class SugungumAgeSeasonCalibSite(DensityCalibSite):
         # Load the Parasitology CSV
         dir_path = os.path.dirname(os.path.realpath(__file__))
         reference_csv = os.path.join(dir_path, 'inputs', 'GarkiDB_data', 'GarkiDBparasitology.csv')
-        reference_data = season_channel_age_density_csv_to_pandas(reference_csv, self.metadata)
+        reference_data = cached_reference_data(season_channel_age_density_csv_to_pandas, reference_csv, self.metadata)
 
         return reference_data
 
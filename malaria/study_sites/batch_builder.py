@@ -0,0 +1,86 @@
+import copy
+import logging
+import multiprocessing
+import os
+import time
+
+from malaria.study_sites import site_setup_functions
+
+logger = logging.getLogger(__name__)
+
+# Base config builder of the worker processes, set once per process by the pool initializer
+_base_cb = None
+
+
+def _init_worker(cb, json_inputs=None):
+    global _base_cb
+    _base_cb = cb
+    if json_inputs:
+        site_setup_functions.set_json_inputs(json_inputs)
+
+
+def build_point(cb, setup_fns, output_dir=None):
+    """
+    Apply a chain of site setup functions (e.g. add_treatment_fn, add_drug_campaign_fn) to a copy of a config builder,
+    and write the config and campaign files of the result.
+    :param cb: the base config builder, which is not modified
+    :param setup_fns: list of callables taking a config builder, returning an optional dict of tags
+    :param output_dir: directory to write config.json and campaign.json to (nothing is written if None)
+    :return: (config builder, tags) where tags merges the dicts returned by the setup functions
+    """
+    point_cb = copy.deepcopy(cb)
+    tags = {}
+    for fn in setup_fns:
+        result = fn(point_cb)
+        if isinstance(result, dict):
+            tags.update(result)
+
+    if output_dir:
+        point_cb.dump_files(output_dir)
+
+    return point_cb, tags
+
+
+def _build_indexed(args):
+    index, setup_fns, output_dir = args
+    _, tags = build_point(_base_cb, setup_fns, output_dir)
+    return index, output_dir, tags
+
+
+def build_batch(cb, points, output_dir, processes=None, chunksize=1, json_inputs=()):
+    """
+    Build the config and campaign files of a list of parameter points across a process pool.
+    The base config builder and the JSON site inputs (see site_setup_functions.load_json_input) are handed to each
+    worker once through the pool initializer, so that workers do not re-read them whether they are forked or spawned.
+    Each point is written to output_dir/<index> as soon as it is built.
+    :param cb: the base config builder
+    :param points: list of parameter points, each a list of picklable site setup functions (as in ModBuilder.from_combos)
+    :param output_dir: directory under which each point gets a directory named by its index
+    :param processes: number of worker processes (default: the number of CPUs); 1 builds serially in this process
+    :param chunksize: number of points sent to a worker at a time
+    :param json_inputs: JSON site input files the setup functions read, loaded once here before the pool starts
+    :return: generator of (index, directory, tags) tuples in completion order
+    """
+    width = len(str(max(len(points) - 1, 0)))
+    tasks = [(i, fns, os.path.join(output_dir, str(i).zfill(width))) for i, fns in enumerate(points)]
+    start = time.time()
+
+    for fname in json_inputs:
+        site_setup_functions.load_json_input(fname)
+
+    if processes == 1:
+        _init_worker(cb)
+        for task in tasks:
+            yield _build_indexed(task)
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(cb, site_setup_functions.get_json_inputs()))
+        try:
+            for result in pool.imap_unordered(_build_indexed, tasks, chunksize=chunksize):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+    elapsed = time.time() - start
+    logger.info('Built %d configs in %.1f s (%.1f configs/s)', len(tasks), elapsed, len(tasks) / max(elapsed, 1e-9))
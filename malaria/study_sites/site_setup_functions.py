@@ -11,8 +11,79 @@ from dtk.interventions.health_seeking import add_health_seeking
 from dtk.utils.reports.CustomReport import BaseReport, BaseVectorStatsReport
 
 import json
+import os
+import threading
+from collections import OrderedDict
+
 import numpy as np
 
+# JSON site inputs shared by all setup functions in this process: path -> ((mtime, size), parsed content)
+_json_inputs = {}
+_json_inputs_lock = threading.Lock()
+
+
+def load_json_input(fname):
+    """
+    Load a JSON site input (e.g. a node coverage file) once per process, reloading it only when the file changes.
+    The returned object is shared by every setup function and simulation, and must not be modified:
+    anything taken from it into a campaign event (e.g. a node list) is copied first.
+    :param fname: path of the JSON file
+    :return: the parsed JSON content
+    """
+    path = os.path.abspath(fname)
+    stat = os.stat(path)
+    key = (stat.st_mtime, stat.st_size)
+
+    with _json_inputs_lock:
+        cached = _json_inputs.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with open(path) as fin:
+        content = json.load(fin)
+    with _json_inputs_lock:
+        _json_inputs[path] = (key, content)
+    return content
+
+
+def get_json_inputs():
+    """
+    The JSON site inputs loaded so far in this process, e.g. to hand them to worker processes
+    :return: dict of absolute path to (mtime, size) key and parsed content
+    """
+    with _json_inputs_lock:
+        return dict(_json_inputs)
+
+
+def set_json_inputs(json_inputs):
+    """
+    Seed the JSON site inputs of this process, as returned by get_json_inputs in another process.
+    Inputs whose file has changed since are reloaded on first use as usual.
+    :param json_inputs: dict of absolute path to (mtime, size) key and parsed content
+    """
+    with _json_inputs_lock:
+        _json_inputs.update(json_inputs)
+
+
+def seasonal_pieces(start, days_in_month, scale_by_month, targets_fn):
+    """
+    Piecewise-constant health-seeking: consecutive months with the same targets are merged into one period.
+    :param start: first day of the first month
+    :param days_in_month: list of month lengths, preceded by 0
+    :param scale_by_month: list of coverage scale factors by month
+    :param targets_fn: function of the scale factor returning the health-seeking targets
+    :return: list of (start_day, duration, targets) tuples
+    """
+    month_starts = start + np.cumsum(days_in_month)
+    pieces = []
+    for month, scale in enumerate(scale_by_month):
+        targets = targets_fn(scale)
+        if pieces and pieces[-1][2] == targets:
+            pieces[-1][1] += days_in_month[month + 1]
+        else:
+            pieces.append([month_starts[month], days_in_month[month + 1], targets])
+    return [tuple(piece) for piece in pieces]
+
 # Call update_params on the CB
 class update_params:
     def __init__(self, params):
@@ -270,18 +341,6 @@ class add_treatment_fn:
 
 
 # health-seeking from nodeid-coverage specified in json
-def add_HS_by_node_id_fn(reffname, start=0) :        
-    def fn(cb) :
-        with open(reffname) as fin :
-            cov = json.loads(fin.read())
-        for hscov in cov['hscov'] :
-            targets = [ { 'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin':15, 'agemax':200, 'seek': hscov['coverage'], 'rate': 0.3 },
-                        { 'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin':0, 'agemax':15, 'seek':  min([1, hscov['coverage']*1.5]), 'rate': 0.3 },
-                        { 'trigger': 'NewSevereCase',   'coverage': 1, 'seek': 0.8, 'rate': 0.5 } ]
-            add_health_seeking(cb, start_day = start, targets=targets, nodes={'Node_List' : hscov['nodes'], "class": "NodeSetNodeList"})
-    return fn
-
-# seasonal health-seeking from nodeid-coverage specified in json
 class add_HS_by_node_id_fn:
     def __init__(self, reffname, start=0):
         self.reffname = reffname
@@ -291,15 +350,15 @@ class add_HS_by_node_id_fn:
         return self.fn(cb)
 
     def fn(self, cb):
-        with open(self.reffname) as fin :
-            cov = json.loads(fin.read())
+        cov = load_json_input(self.reffname)
         for hscov in cov['hscov'] :
             targets = [{'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin':15, 'agemax':200, 'seek': hscov['coverage'], 'rate': 0.3},
                        {'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin':0, 'agemax':15, 'seek':  min([1, hscov['coverage']*1.5]), 'rate': 0.3},
                        {'trigger': 'NewSevereCase',   'coverage': 1, 'seek': 0.8, 'rate': 0.5}]
-            add_health_seeking(cb, start_day=self.start, targets=targets, nodes={'Node_List': hscov['nodes'], "class": "NodeSetNodeList"})
+            add_health_seeking(cb, start_day=self.start, targets=targets, nodes={'Node_List': list(hscov['nodes']), "class": "NodeSetNodeList"})
 
 
+# seasonal health-seeking from nodeid-coverage specified in json
 class add_seasonal_HS_by_node_id_fn:
     def __init__(self, reffname, days_in_month, scale_by_month, start=0):
         self.reffname = reffname
@@ -311,19 +370,20 @@ class add_seasonal_HS_by_node_id_fn:
         return self.fn(cb)
 
     def fn(self, cb):
-        with open(self.reffname) as fin :
-            cov = json.loads(fin.read())
+        cov = load_json_input(self.reffname)
+
+        # node groups with the same coverage share their events
+        nodes_by_coverage = OrderedDict()
         for hscov in cov['hscov']:
-            ad_cov = hscov['coverage']
-            kid_cov = min([1, hscov['coverage']*1.5])
-            sev_cov = 0.8
+            nodes_by_coverage.setdefault(hscov['coverage'], []).extend(hscov['nodes'])
 
-            for start_month in range(len(self.scale_by_month)) :
-                start_day = self.start+np.cumsum(self.days_in_month)[start_month]
-                duration = self.days_in_month[start_month+1]
+        for coverage, nodes in nodes_by_coverage.items():
+            ad_cov = coverage
+            kid_cov = min([1, coverage*1.5])
+            sev_cov = 0.8
 
-                scale = self.scale_by_month[start_month]
-                targets = [
+            def targets_fn(scale):
+                return [
                     {'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin': 15, 'agemax': 200,
                      'seek': min([1, ad_cov*scale]), 'rate': 0.3},
                     {'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin': 0, 'agemax': 15,
@@ -331,10 +391,12 @@ class add_seasonal_HS_by_node_id_fn:
                     {'trigger': 'NewSevereCase', 'coverage': 1,
                      'seek': min([1, max([sev_cov*scale, kid_cov*scale])]), 'rate': 0.5}]
 
+            for start_day, duration, targets in seasonal_pieces(self.start, self.days_in_month,
+                                                                self.scale_by_month, targets_fn):
                 add_health_seeking(cb, start_day=start_day, targets=targets,
                                    duration=duration, repetitions=-1,
                                    drug_ineligibility_duration=14,
-                                   nodes={'Node_List': hscov['nodes'], "class": "NodeSetNodeList"})
+                                   nodes={'Node_List': nodes, "class": "NodeSetNodeList"})
 
 class add_seasonal_HS_by_NP_fn:
     def __init__(self, fname, channel, start_day, days_in_month, scale_by_month, duration_years):
@@ -357,18 +419,16 @@ class add_seasonal_HS_by_NP_fn:
 
         from dtk.interventions.property_change import change_node_property
 
-        with open(self.fname) as fin:
-            interv = json.loads(fin.read())
+        interv = load_json_input(self.fname)
 
         covlist = interv[self.channel]
         for i, item in enumerate(covlist):
             code = 'group%d' % i
-            change_node_property(cb, self.prop_name, code, start_day=self.date, nodeIDs=item['nodes'])
+            change_node_property(cb, self.prop_name, code, start_day=self.date, nodeIDs=list(item['nodes']))
 
     def seasonal_health_seeking(self, cb):
 
-        with open(self.fname) as fin:
-            cov = json.loads(fin.read())
+        cov = load_json_input(self.fname)
         for i, hscov in enumerate(cov[self.channel]):
 
             code = 'group%d' % i
@@ -376,11 +436,8 @@ class add_seasonal_HS_by_NP_fn:
             kid_cov = min([1, hscov['coverage'] * 1.5])
             sev_cov = 0.8
 
-            for start_month in range(len(self.scale_by_month)):
-                start_day = int(self.date + np.cumsum(self.days_in_month)[start_month])
-                duration = self.days_in_month[start_month + 1]
-                scale = self.scale_by_month[start_month]
-                targets = [
+            def targets_fn(scale):
+                return [
                     {'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin': 15, 'agemax': 200,
                      'seek': min([1, ad_cov * scale]), 'rate': 0.3},
                     {'trigger': 'NewClinicalCase', 'coverage': 1, 'agemin': 0, 'agemax': 15,
@@ -388,7 +445,9 @@ class add_seasonal_HS_by_NP_fn:
                     {'trigger': 'NewSevereCase', 'coverage': 1,
                      'seek': min([1, max([sev_cov * scale, kid_cov * scale])]), 'rate': 0.5}]
 
-                add_health_seeking(cb, start_day=start_day, targets=targets,
+            for start_day, duration, targets in seasonal_pieces(self.date, self.days_in_month,
+                                                                self.scale_by_month, targets_fn):
+                add_health_seeking(cb, start_day=int(start_day), targets=targets,
                                    duration=duration, repetitions=self.duration_years + 1,
                                    drug_ineligibility_duration=14,
                                    node_property_restrictions=[{self.prop_name: code}])
@@ -444,8 +503,7 @@ class add_itn_by_node_id_fn:
     def fn(self, cb) :
         birth_durations = [self.itn_dates[x] - self.itn_dates[x + 1] for x in range(len(self.itn_dates) - 1)]
         # itn_distr = zip(self.itn_dates[:-1], self.itn_fracs)
-        with open(self.reffname) as fin :
-            cov = json.loads(fin.read())
+        cov = load_json_input(self.reffname)
         for itncov in cov[self.channel] :
             if itncov['coverage'] > 0 :
                 for i, (itn_date, itn_frac) in enumerate(zip(self.itn_dates, self.itn_fracs)):
@@ -457,7 +515,7 @@ class add_itn_by_node_id_fn:
                                               {'birth': 1, 'coverage': min([1,c*1.3]), 'duration': max([-1, birth_durations[i]])},
                                               {'min': 5, 'max': 20, 'coverage': c / 2},
                                               {'min': 20, 'max': 100, 'coverage': min([1, c*1.3])}],
-                            waning=self.waning, nodeIDs=itncov['nodes'])
+                            waning=self.waning, nodeIDs=list(itncov['nodes']))
 
 
 # IRS
@@ -493,8 +551,7 @@ class add_node_level_irs_by_node_id_fn:
         nodelist = {x: [] for x in self.irs_dates}
 
         irs_distr = zip(self.irs_dates, self.irs_fracs)
-        with open(self.reffname) as fin:
-            cov = json.loads(fin.read())
+        cov = load_json_input(self.reffname)
         for irscov in cov[self.channel]:
             if irscov['coverage'] > 0:
                 for i, (irs_date, irs_frac) in enumerate(irs_distr):
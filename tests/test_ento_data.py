@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('dtk.utils.parsers.malaria_summary')
+from malaria.analyzers.Helpers import ento_data, ento_spatial_data
+
+
+def per_species_means(df, species, groups):
+    """
+    Per-species groupby and concat of the original ento_data and ento_spatial_data
+    """
+    df['date'] = pd.to_datetime(df['date'])
+    df['Month'] = df['date'].apply(lambda x: int(x.strftime('%m')))
+    df2 = df.groupby(groups)['gambiae'].apply(np.mean).reset_index()
+    df2['funestus'] = list(df.groupby(groups)['funestus'].apply(np.mean))
+
+    dfs = []
+    for spec in species:
+        df1 = df2[groups + [spec]].rename(columns={spec: 'Counts'})
+        df1['Channel'] = [spec] * len(df1)
+        dfs.append(df1)
+
+    return pd.concat(dfs).sort_values(['Channel'] + groups).set_index(['Channel'] + groups)
+
+
+def counts_per_adult(csvfilename):
+    df = pd.read_csv(csvfilename)
+    df = df[['date', 'gambiae_count', 'funestus_count', 'adult_house']]
+    df['gambiae'] = df['gambiae_count'] / df['adult_house']
+    df['funestus'] = df['funestus_count'] / df['adult_house']
+    return df.dropna()
+
+
+@pytest.fixture
+def mosquito_counts(tmp_path):
+    """
+    Household mosquito counts over two years in the m/d/y format of the Magude files, with missing values
+    """
+    rng = np.random.RandomState(0)
+    days = pd.date_range('2015-01-01', '2016-12-31', freq='9D')
+    dates = rng.choice(days, 300)
+    df = pd.DataFrame({'date': ['%d/%d/%d' % (d.month, d.day, d.year) for d in pd.to_datetime(dates)],
+                       'gambiae_count': rng.poisson(3, 300).astype(float),
+                       'funestus_count': rng.poisson(1, 300).astype(float),
+                       'adult_house': rng.randint(0, 6, 300).astype(float),
+                       'hh_id': range(300)})
+    df.loc[rng.choice(300, 20, replace=False), 'gambiae_count'] = np.nan
+    df.loc[rng.choice(300, 20, replace=False), 'date'] = np.nan
+    filename = str(tmp_path / 'mosquito_count_by_house_day.csv')
+    df.to_csv(filename, index=False)
+    return filename
+
+
+@pytest.mark.parametrize('species', [['gambiae'], ['gambiae', 'funestus'], ['funestus', 'gambiae']])
+def test_ento_data_matches_per_species_means(mosquito_counts, species):
+    expected = per_species_means(counts_per_adult(mosquito_counts), species, ['Month'])
+    result = ento_data(mosquito_counts, {'species': species})
+
+    assert result.index.names == ['Channel', 'Month']
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_ento_spatial_data_matches_per_species_means(mosquito_counts):
+    species = ['gambiae', 'funestus']
+    random.seed(1)
+    df = counts_per_adult(mosquito_counts)
+    df['NodeID'] = [random.randint(0, 32) for i in range(len(df))]
+    expected = per_species_means(df, species, ['Month', 'NodeID'])
+
+    random.seed(1)
+    result = ento_spatial_data(mosquito_counts, None, None, {'species': species})
+
+    assert result.index.names == ['Channel', 'Month', 'NodeID']
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
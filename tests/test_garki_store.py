@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('dtk.utils.parsers.malaria_summary')
+from malaria.analyzers.Helpers import get_garki_store, garki_store_to_pandas, garki_season_age_density_counts
+
+
+metadata = {'village': 'Sugungum',
+            'seasons': ['DC2', 'DH2', 'start_wet'],
+            'age_bins': [5, 15, 1000],
+            'parasitemia_bins': [0, 50, 500, 5000]}
+
+
+@pytest.fixture
+def parasitology(tmp_path):
+    """
+    GarkiDB parasitology rows of three villages, with missing villages, seasons and dates
+    """
+    rng = np.random.RandomState(0)
+    n = 400
+    df = pd.DataFrame({'Patient_id': range(n),
+                       'Village': rng.choice(['Sugungum', 'Ajura', 'Rafin Marke'], n).astype(object),
+                       'Seasons': rng.choice(['DC2', 'DH2', 'start_wet', 'end_wet'], n).astype(object),
+                       'Date': rng.choice(['1971-04-02', '1971-06-30', '1972-01-15'], n).astype(object),
+                       'Age': np.round(rng.uniform(0, 60, n), 3),
+                       'Parasitemia': rng.choice([0, 0.005, 0.1, 0.5, 0.9, 1.0], n),
+                       'Gametocytemia': rng.choice([0, 0.005, 0.1], n)})
+    for column in ['Village', 'Seasons', 'Date']:
+        df.loc[rng.choice(n, 30, replace=False), column] = np.nan
+    filename = str(tmp_path / 'GarkiDBparasitology.csv')
+    df.to_csv(filename)
+    return filename
+
+
+def test_garki_store_to_pandas_keeps_missing_values(parasitology, tmp_path):
+    store = get_garki_store(parasitology, str(tmp_path / 'store'))
+    df = pd.read_csv(parasitology)
+
+    for village in ['Sugungum', 'Ajura', 'Rafin Marke']:
+        expected = df[df['Village'] == village].reset_index(drop=True)
+        result = garki_store_to_pandas(store, village)
+        assert result['Seasons'].isnull().any() and result['Date'].isnull().any()
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    partitions = store['manifest']['partitions']
+    assert sum(stop - start for start, stop in partitions.values()) == df['Village'].notnull().sum()
+
+
+def test_garki_season_age_density_counts_skips_missing_seasons(parasitology, tmp_path):
+    store = get_garki_store(parasitology, str(tmp_path / 'store'))
+    df = pd.read_csv(parasitology)
+    df = df[(df['Village'] == metadata['village']) & df['Seasons'].isin(metadata['seasons'])]
+
+    pfpr_edges = 1 - np.exp(-np.asarray(metadata['parasitemia_bins'], dtype=float) * 0.5 / 200.0)
+    expected = np.zeros((3, 3, 4), dtype=np.int64)
+    for season, age, density in zip(df['Seasons'], df['Age'], df['Parasitemia']):
+        i, j = np.searchsorted(metadata['age_bins'], age), np.searchsorted(pfpr_edges, density)
+        if i < 3 and j < 4:
+            expected[metadata['seasons'].index(season), i, j] += 1
+
+    counts = garki_season_age_density_counts(store, metadata, 'Parasitemia')
+    assert counts.sum() > 0
+    np.testing.assert_array_equal(counts, expected)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('dtk.utils.parsers.malaria_summary')
+from malaria.analyzers.Helpers import hhs_to_nodes, haversine_km
+
+
+def loop_node_labels(points, num_cells_x, num_cells_y, cell_household_threshold=1):
+    """
+    Household-by-household nearest valid centroid search of the original hhs_to_nodes,
+    with its intended cell masking and (x, y) label lookup
+    """
+    H, xedges, yedges = np.histogram2d(points[:, 0], points[:, 1], bins=[num_cells_x, num_cells_y])
+    x_mid = (xedges[1:] + xedges[:-1]) / 2
+    y_mid = (yedges[1:] + yedges[:-1]) / 2
+    X_mid, Y_mid = np.meshgrid(x_mid, y_mid)
+
+    valid = H >= cell_household_threshold
+    coor_idxs_2_node_label = dict(((idx_x, idx_y), str(i)) for i, (idx_x, idx_y) in enumerate(zip(*np.where(valid))))
+
+    node_label = []
+    for point in points:
+        x = X_mid - point[0]
+        y = Y_mid - point[1]
+        dist = x**2 + y**2
+        dist[~valid.T] = np.inf
+        neigh_cand = np.argwhere(dist == np.min(dist))
+        node_label.append(coor_idxs_2_node_label[(neigh_cand[0][1], neigh_cand[0][0])])
+    return node_label, xedges, yedges
+
+
+@pytest.fixture
+def households(tmp_path):
+    """
+    Clustered households on a 6 x 7 km grid, with coordinates that are exact binary fractions so that
+    the grid edges are exact and households can be placed on them
+    """
+    rng = np.random.RandomState(0)
+    x_min, x_max = 32.00390625, 32.05078125  # 6 cells of 2**-7 degrees
+    y_min, y_max = -25.046875, -25.01953125  # 7 cells of 2**-8 degrees
+    xedges = np.linspace(x_min, x_max, 7)
+    yedges = np.linspace(y_min, y_max, 8)
+
+    lon = [x_min, x_max] + list(np.round(rng.uniform(x_min, 32.025, 40) * 2**20) / 2**20)
+    lat = [y_min, y_max] + list(np.round(rng.uniform(y_min, -25.03, 40) * 2**20) / 2**20)
+    # households exactly on interior edges and grid vertices
+    lon += list(xedges[1:-1]) + [32.0234375] * 6 + list(xedges[1:4])
+    lat += [-25.0390625] * 5 + list(yedges[1:-1]) + list(yedges[1:4])
+    # bounding box households, excluded from the grid by hhs_to_nodes
+    lon += [32.0, 32.0546875]
+    lat += [-25.0546875, -25.0]
+
+    ids = ['hh%d' % i for i in range(len(lon))]
+    hh_hf = pd.DataFrame({'hf_name': 'Test HF', 'House_ID': ids, 'lat_r2': lat, 'lng_r2': lon})
+    hhs = pd.DataFrame({'ID': ids, 'household_number_mda1': range(len(ids))})
+    hh_hf.to_csv(str(tmp_path / 'hh_hf.csv'), index=False)
+    hhs.to_csv(str(tmp_path / 'hhs.csv'), index=False)
+    return str(tmp_path / 'hh_hf.csv'), str(tmp_path / 'hhs.csv')
+
+
+def test_hhs_to_nodes_matches_household_loop(households):
+    hh_hf_file, hhs_file = households
+    records = hhs_to_nodes(hh_hf_file, hhs_file, {'hf': 'Test HF'})
+
+    num_cells_x = int(1000 * haversine_km(-25.0546875, 32.0, -25.0546875, 32.0546875) / 1000) + 1
+    num_cells_y = int(1000 * haversine_km(-25.0546875, 32.0, -25.0, 32.0) / 1000) + 1
+    points = records[['lon', 'lat']].values
+    expected, xedges, yedges = loop_node_labels(points, num_cells_x, num_cells_y)
+
+    on_edges = np.isin(points[:, 0], xedges[1:-1]) | np.isin(points[:, 1], yedges[1:-1])
+    assert len(records) == 56
+    assert on_edges.sum() >= 10
+    assert records['NodeID'].tolist() == expected
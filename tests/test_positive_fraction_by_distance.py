@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('calibtool.analyzers.BaseCalibrationAnalyzer')
+from malaria.analyzers.PositiveFractionByDistanceAnalyzer import PositiveFractionByDistanceAnalyzer
+
+
+class Site(object):
+    name = 'Test'
+
+    def get_reference_data(self, reference_type):
+        return {'distances': [0, 1, 2], 'risks': [0.5, 0.3, 0.2], 'prevalence': 0.1}
+
+    def get_ignore_node_list(self):
+        return []
+
+    def get_distance_matrix(self):
+        return None
+
+
+def test_batch_compare_matches_compare_with_missing_values():
+    rng = np.random.RandomState(0)
+    y = PositiveFractionByDistanceAnalyzer.y
+    index = pd.MultiIndex.from_product([range(4), [0, 1, 2, 1000]], names=['sample', 'distance'])
+    data = pd.DataFrame({y: rng.uniform(size=len(index))}, index=index)
+    data.loc[(1, 2), y] = np.nan
+    data.loc[(3, 1000), y] = np.nan
+
+    batched = PositiveFractionByDistanceAnalyzer(Site())
+    per_sample = PositiveFractionByDistanceAnalyzer(Site(), batch_compare_fn=None)
+    for analyzer in [batched, per_sample]:
+        analyzer.data = data
+        analyzer.finalize()
+
+    assert batched.result.isnull().tolist() == [False, True, False, True]
+    pd.testing.assert_series_equal(batched.result, per_sample.result, check_names=False)
@@ -0,0 +1,112 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('calibtool.analyzers.BaseCalibrationAnalyzer')
+from malaria.analyzers.PrevalenceByRoundAnalyzer import PrevalenceByRoundAnalyzer
+
+
+class Site(object):
+    name = 'Test'
+
+    def __init__(self, reference, regions):
+        self.reference = reference
+        self.regions = regions
+
+    def get_reference_data(self, reference_type):
+        return self.reference
+
+    def get_region_list(self):
+        return list(self.regions)
+
+
+class Parser(object):
+    def __init__(self, sample, sim_id, series):
+        self.sim_data = {'__sample_index__': sample}
+        self.sim_id = sim_id
+        self.raw_data = dict((filename, {'Channels': {PrevalenceByRoundAnalyzer.y: {'Data': list(data)}}})
+                             for filename, data in series.items())
+        self.selected_data = {}
+
+
+@pytest.fixture
+def site():
+    """
+    Two regions surveyed on the same three rounds, listed round by round as in a survey table
+    """
+    reference = {'grid_cell': ['a', 'b'] * 3,
+                 'sim_date': [300, 300, 100, 100, 200, 200],
+                 'prev': [0.3, 0.6, 0.1, 0.4, 0.2, 0.5]}
+    return Site(reference, ['a', 'b'])
+
+
+def run(analyzer, num_samples=2, num_replicates=2):
+    rng = np.random.RandomState(0)
+    series = {}
+    for sample in range(num_samples):
+        for replicate in range(num_replicates):
+            sim_id = 's%d_r%d' % (sample, replicate)
+            series[sim_id] = dict((filename, rng.uniform(size=365)) for filename in analyzer.filenames)
+            analyzer.apply(Parser(sample, sim_id, series[sim_id]))
+    analyzer.combine({})
+    analyzer.finalize()
+    return series
+
+
+@pytest.mark.parametrize('batch', [True, False])
+def test_finalize_two_regions(site, batch):
+    kwargs = {} if batch else {'batch_compare_fn': None}
+    analyzer = PrevalenceByRoundAnalyzer(site, **kwargs)
+    series = run(analyzer)
+
+    assert analyzer.data.shape == (2 * 2 * 3, 1)
+    ref = {'a': np.array([0.1, 0.2, 0.3]), 'b': np.array([0.4, 0.5, 0.6])}
+    for sample in range(2):
+        expected = 0
+        for region, filename in zip(analyzer.regions, analyzer.filenames):
+            sim = np.mean([series['s%d_r%d' % (sample, r)][filename][[100, 200, 300]] for r in range(2)], axis=0)
+            np.testing.assert_allclose(analyzer.data.loc[(sample, region), analyzer.y].values, sim)
+            expected -= np.sqrt(np.sum((ref[region] - sim) ** 2))
+        assert analyzer.result[sample] == pytest.approx(expected)
+
+
+def test_combine_twice(site):
+    analyzer = PrevalenceByRoundAnalyzer(site)
+    rng = np.random.RandomState(0)
+    parsers = {}
+    for sim_id in range(4):
+        parser = Parser(sim_id % 2, sim_id, dict((f, rng.uniform(size=365)) for f in analyzer.filenames))
+        parser.selected_data[id(analyzer)] = analyzer.apply(parser)
+        parsers[sim_id] = parser
+
+    analyzer.combine(parsers)
+    first = analyzer.data
+    analyzer.combine(parsers)
+    pd.testing.assert_frame_equal(analyzer.data, first)
+
+    other = copy.deepcopy(analyzer)
+    other.finalize()
+    analyzer.finalize()
+    pd.testing.assert_series_equal(other.result, analyzer.result)
+
+
+def test_batch_compare_matches_compare_with_missing_values():
+    reference = {'grid_cell': ['a', 'b', 'a', 'b', 'a'],
+                 'sim_date': [100, 100, 200, 200, 300],
+                 'prev': [0.1, 0.4, 0.2, 0.5, 0.3]}
+    site = Site(reference, ['a', 'b'])
+    batched = PrevalenceByRoundAnalyzer(site)
+    run(batched, num_samples=4)
+    # a missing surveyed round in sample 1 and a missing unsurveyed round (region b on day 300) in sample 2
+    batched.data.loc[(1, 'a', 200), batched.y] = np.nan
+    batched.data.loc[(2, 'b', 300), batched.y] = np.nan
+    batched.finalize()
+
+    per_sample = PrevalenceByRoundAnalyzer(site, batch_compare_fn=None)
+    per_sample.data = batched.data
+    per_sample.finalize()
+
+    assert batched.result.isnull().tolist() == [False, True, False, False]
+    pd.testing.assert_series_equal(batched.result, per_sample.result, check_names=False)
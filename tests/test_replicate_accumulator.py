@@ -0,0 +1,56 @@
+import copy
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from malaria.analyzers.ReplicateAccumulator import ReplicateAccumulator
+
+
+def replicates():
+    index = pd.Index([1, 2, 3], name='bin')
+    return [pd.DataFrame({'x': [1., 2., np.nan]}, index=index),
+            pd.DataFrame({'x': [3., np.nan, np.nan]}, index=index)]
+
+
+def test_means_skip_missing_values_and_repeated_frames():
+    accumulator = ReplicateAccumulator()
+    dfs = replicates()
+    for df in dfs + dfs:
+        accumulator.add(0, df)
+
+    assert len(accumulator) == 2
+    means = accumulator.means()[0]['x']
+    assert means.tolist()[:2] == [2., 2.] and np.isnan(means[3])
+
+
+def test_duplicate_bins_raise():
+    with pytest.raises(ValueError):
+        ReplicateAccumulator().add(0, pd.DataFrame({'x': [1., 2.]}, index=[1, 1]))
+
+
+def test_frames_are_added_again_after_reset():
+    accumulator = ReplicateAccumulator()
+    dfs = replicates()
+    for df in dfs:
+        accumulator.add(0, df)
+    first = accumulator.means()
+    accumulator.reset()
+
+    for df in dfs:
+        accumulator.add(0, df)
+    assert len(accumulator) == 2
+    pd.testing.assert_frame_equal(accumulator.means()[0], first[0])
+
+
+@pytest.mark.parametrize('clone', [copy.deepcopy, lambda a: pickle.loads(pickle.dumps(a))])
+def test_copies_have_their_own_lock(clone):
+    accumulator = ReplicateAccumulator()
+    accumulator.add(0, replicates()[0])
+
+    other = clone(accumulator)
+    other.add(0, replicates()[1])
+    assert len(other) == 2 and len(accumulator) == 1
+    assert other.lock is not accumulator.lock
+    assert other.means()[0]['x'].tolist()[0] == 2.
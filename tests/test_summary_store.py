@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('dtk.utils.parsers.malaria_summary')
+from malaria.analyzers.Helpers import get_summary_store, summary_report_channels, summary_store_channel_to_pandas
+
+
+class Parser(object):
+    def __init__(self, sim_dir, sim_id):
+        self.sim_dir = sim_dir
+        self.sim_id = sim_id
+        self.raw_data = {}
+
+
+def write_report(sim_dir, age_bin_values=None):
+    """
+    MalariaSummaryReport of 3 reports, 2 age bins and 3 parasitemia bins, with a grouping of unknown bins
+    """
+    rng = np.random.RandomState(0)
+    report = {'Metadata': {'Start_Day': 0, 'Reporting_Interval': 365,
+                           'Age Bins': [5, 100], 'Parasitemia Bins': [0, 50, 500],
+                           'Infectiousness Bins': [0, 20, 40, 60]},
+              'DataByTime': {'Time Of Report': [365, 730, 1095],
+                             'PfPR_2to10': rng.uniform(size=3).tolist()},
+              'DataByTimeAndAgeBins': {'Average Population by Age Bin': age_bin_values or
+                                       rng.uniform(size=(3, 2)).tolist()},
+              'DataByTimeAndPfPRBinsAndAgeBins': {'PfPR by Parasitemia and Age Bin':
+                                                  rng.uniform(size=(3, 3, 2)).tolist()},
+              'DataByTimeAndInfectiousnessBinsAndAgeBins': {'Infectiousness by smeared Infectiousness and Age Bin':
+                                                            rng.uniform(size=(3, 4, 2)).tolist()}}
+    os.makedirs(os.path.join(sim_dir, 'output'))
+    with open(os.path.join(sim_dir, 'output', 'MalariaSummaryReport_Annual.json'), 'w') as fout:
+        json.dump(report, fout)
+    return report
+
+
+def test_summary_store_skips_unknown_groupings(tmp_path):
+    sim_dir = str(tmp_path / 'sim')
+    report = write_report(sim_dir)
+
+    data, channel_to_pandas = summary_report_channels(Parser(sim_dir, 'sim'), 'output/MalariaSummaryReport_Annual.json',
+                                                      str(tmp_path / 'stores'))
+    assert channel_to_pandas is summary_store_channel_to_pandas
+    assert 'DataByTimeAndInfectiousnessBinsAndAgeBins' not in data['manifest']['groupings']
+
+    series = channel_to_pandas(data, 'PfPR by Parasitemia and Age Bin')
+    assert series.index.names == ['Time', 'PfPR Bin', 'Age Bin']
+    values = report['DataByTimeAndPfPRBinsAndAgeBins']['PfPR by Parasitemia and Age Bin']
+    assert series.loc[(730, 50, 100)] == values[1][1][1]
+    assert series.Reporting_Interval == 365
+
+    series = channel_to_pandas(data, 'PfPR_2to10')
+    np.testing.assert_array_equal(series.values, report['DataByTime']['PfPR_2to10'])
+
+
+def test_summary_store_falls_back_to_report(tmp_path):
+    sim_dir = str(tmp_path / 'sim')
+    report = write_report(sim_dir, age_bin_values=[[1, 2, 3]] * 3)
+    report_path = os.path.join(sim_dir, 'output', 'MalariaSummaryReport_Annual.json')
+
+    assert get_summary_store(report_path, str(tmp_path / 'store')) is None
+
+    data, _ = summary_report_channels(Parser(sim_dir, 'sim'), 'output/MalariaSummaryReport_Annual.json',
+                                      str(tmp_path / 'stores'))
+    assert data == report